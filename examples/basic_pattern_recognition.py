@@ -3,16 +3,17 @@ Basic Pattern Recognition Example
 Demonstrates how to use the PatternRecognizer class for exam image analysis.
 """
 
-import sys
 import os
 import cv2
 import numpy as np
 
-# Add parent directory to path to import exam_evaluator
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
-
 from exam_evaluator import PatternRecognizer
 
+# Single small image: OpenCV's worker threads cost more than they save
+cv2.setNumThreads(1)
+
+OUT_DIR = os.path.dirname(__file__)
+
 
 def create_sample_exam_image(output_path: str):
     """
@@ -21,41 +22,47 @@ def create_sample_exam_image(output_path: str):
     Args:
         output_path: Path where the sample image will be saved
     """
-    # Create a white canvas
+    # Create a white single-channel canvas: the sheet is black on white, so
+    # drawing into one channel carries all the information at a third of the writes
     height, width = 600, 800
-    image = np.ones((height, width, 3), dtype=np.uint8) * 255
+    image = np.full((height, width), 255, dtype=np.uint8)
     
     # Add title text
     cv2.putText(image, "Sample Exam - Multiple Choice", (50, 50),
-                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+                cv2.FONT_HERSHEY_SIMPLEX, 1, 0, 2)
     
     # Draw sample questions with answer bubbles
     y_start = 120
     questions = 5
-    
-    for i in range(questions):
-        y_pos = y_start + (i * 80)
-        
+    choices = ['A', 'B', 'C', 'D']
+    bubble_xs = 250 + np.arange(len(choices)) * 100
+    row_ys = y_start + np.arange(questions) * 80
+    
+    # Render one row of bubbles and letter labels once; every question row is
+    # identical, so it is stamped into place instead of being redrawn.
+    # Local row coordinates are offset so that y_pos maps to `row_offset`.
+    row_offset, row_height = 30, 80
+    bubble_row = np.full((row_height, width), 255, dtype=np.uint8)
+    for x_pos, letter in zip(bubble_xs.tolist(), choices):
+        cv2.circle(bubble_row, (x_pos, row_offset - 10), 15, 0, 2)
+        cv2.putText(bubble_row, letter, (x_pos - 8, row_offset + 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, 0, 1)
+    
+    for i, y_pos in enumerate(row_ys.tolist()):
         # Question number
         cv2.putText(image, f"Question {i+1}:", (50, y_pos),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, 0, 1)
         
-        # Draw answer bubbles (A, B, C, D)
-        for j, letter in enumerate(['A', 'B', 'C', 'D']):
-            x_pos = 250 + (j * 100)
-            
-            # Draw circle (answer bubble)
-            cv2.circle(image, (x_pos, y_pos - 10), 15, (0, 0, 0), 2)
-            
-            # Add letter label
-            cv2.putText(image, letter, (x_pos - 8, y_pos + 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
-            
-            # Fill some bubbles as "marked" answers
-            if (i == 0 and j == 1) or (i == 2 and j == 2) or (i == 4 and j == 0):
-                cv2.circle(image, (x_pos, y_pos - 10), 10, (0, 0, 0), -1)
-    
-    # Save the image
+        # Stamp the answer bubbles (A, B, C, D); black ink wins over white paper
+        band = image[y_pos - row_offset:y_pos - row_offset + row_height]
+        np.minimum(band, bubble_row, out=band)
+    
+    # Fill some bubbles as "marked" answers: (question, choice) pairs
+    marked = np.array([(0, 1), (2, 2), (4, 0)])
+    for x_pos, y_pos in zip(bubble_xs[marked[:, 1]].tolist(), row_ys[marked[:, 0]].tolist()):
+        cv2.circle(image, (x_pos, y_pos - 10), 10, 0, -1)
+    
+    # Save the image (PNG stores it as grayscale)
     cv2.imwrite(output_path, image)
     print(f"Sample exam image created: {output_path}")
 
@@ -72,16 +79,22 @@ def main():
     print(f"\n✓ OpenCV version: {recognizer.opencv_version}")
     
     # Create a sample exam image
-    sample_image_path = os.path.join(os.path.dirname(__file__), 'sample_exam.png')
+    sample_image_path = os.path.join(OUT_DIR, 'sample_exam.png')
     create_sample_exam_image(sample_image_path)
     
-    # Load and process the image
-    print(f"\n1. Loading image: {sample_image_path}")
-    image = recognizer.load_image(sample_image_path)
+    # Load and analyze the image in one pass (grayscale computed once and shared).
+    # Bubbles are drawn with radius 15 and spaced >= 80 px apart, so the Hough
+    # search is restricted to that geometry to keep the accumulator small.
+    print(f"\n1. Loading and analyzing image: {sample_image_path}")
+    analysis = recognizer.analyze_exam_image(
+        sample_image_path, low_threshold=50, high_threshold=150,
+        threshold_value=127, min_radius=13, max_radius=17, dp=1.5, min_dist=80
+    )
     
-    if image is None:
+    if analysis is None:
         print("Error: Failed to load image")
         return
+    image = analysis['image']
     
     # Display image information
     print("\n2. Image Information:")
@@ -91,28 +104,24 @@ def main():
     
     # Convert to grayscale
     print("\n3. Converting to grayscale...")
-    gray = recognizer.convert_to_grayscale(image)
-    print(f"   ✓ Grayscale image shape: {gray.shape}")
+    print(f"   ✓ Grayscale image shape: {analysis['gray'].shape}")
     
     # Detect edges
     print("\n4. Detecting edges using Canny edge detection...")
-    edges = recognizer.detect_edges(gray, low_threshold=50, high_threshold=150)
-    edge_count = np.count_nonzero(edges)
+    edge_count = cv2.countNonZero(analysis['edges'])  # Canny output is contiguous single-channel uint8
     print(f"   ✓ Edge pixels detected: {edge_count}")
     
     # Apply threshold
     print("\n5. Applying binary threshold...")
-    binary = recognizer.apply_threshold(gray, threshold_value=127)
     print(f"   ✓ Binary image created")
     
     # Find contours
     print("\n6. Finding contours...")
-    contours, hierarchy = recognizer.find_contours(binary)
-    print(f"   ✓ Number of contours found: {len(contours)}")
+    print(f"   ✓ Number of contours found: {len(analysis['contours'])}")
     
     # Detect circles (answer bubbles)
     print("\n7. Detecting circles (answer bubbles)...")
-    circles = recognizer.detect_circles(gray, min_radius=10, max_radius=30)
+    circles = analysis['circles']
     
     if circles is not None:
         circles = np.uint16(np.around(circles))
@@ -128,7 +137,7 @@ def main():
             # Draw center point
             cv2.circle(output_image, center, 2, (0, 0, 255), 3)
         
-        output_path = os.path.join(os.path.dirname(__file__), 'detected_circles.png')
+        output_path = os.path.join(OUT_DIR, 'detected_circles.png')
         cv2.imwrite(output_path, output_image)
         print(f"   ✓ Circles visualization saved: {output_path}")
     else:
@@ -136,9 +145,9 @@ def main():
     
     # Preprocess the exam image
     print("\n8. Preprocessing exam image (complete pipeline)...")
-    preprocessed = recognizer.preprocess_exam_image(sample_image_path)
+    preprocessed = analysis['preprocessed']
     if preprocessed is not None:
-        preprocessed_path = os.path.join(os.path.dirname(__file__), 'preprocessed_exam.png')
+        preprocessed_path = os.path.join(OUT_DIR, 'preprocessed_exam.png')
         cv2.imwrite(preprocessed_path, preprocessed)
         print(f"   ✓ Preprocessed image saved: {preprocessed_path}")
     
@@ -1,17 +1,21 @@
 """Debug script to check cell detection"""
 import os
-import sys
 import cv2
 import numpy as np
 
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 from exam_evaluator import PatternRecognizer
 
+# Single small image: OpenCV's worker threads cost more than they save
+cv2.setNumThreads(1)
+
+OUT_DIR = os.path.dirname(__file__)
+CELL_PATH_FORMAT = os.path.join(OUT_DIR, 'debug_cell_q1_c{}.png')
+
 recognizer = PatternRecognizer()
 
-# Load filled exam
-filled_path = os.path.join(os.path.dirname(__file__), 'filled_exam.png')
-image = cv2.imread(filled_path)
+# Load filled exam directly as grayscale (the recognizer works on gray anyway)
+filled_path = os.path.join(OUT_DIR, 'filled_exam.png')
+image = cv2.imread(filled_path, cv2.IMREAD_GRAYSCALE)
 
 # Convert to binary
 binary = recognizer.convert_to_black_and_white(image)
@@ -22,19 +26,17 @@ cells = recognizer.extract_answer_cells(
     template_size=(800, 1000), margin=40, alignment_square_size=40
 )
 
-# Check first question cells
+# Black-pixel ratios for every cell of question 1 in one batched call
+ratios = recognizer.cell_black_ratios(binary, cells[0])
+marked = ratios >= 0.30
+
 print("Checking Question 1 cells:")
 for i, (x, y, w, h) in enumerate(cells[0]):
-    cell = binary[y:y+h, x:x+w]
-    black_pixels = np.sum(cell == 0)
-    total_pixels = cell.size
-    ratio = black_pixels / total_pixels if total_pixels > 0 else 0
-    is_marked = recognizer.is_cell_marked(binary, (x, y, w, h), 0.30)
-    print(f"  Choice {i} (x={x}, y={y}, w={w}, h={h}): black_ratio={ratio:.4f}, marked={is_marked}")
+    print(f"  Choice {i} (x={x}, y={y}, w={w}, h={h}): black_ratio={ratios[i]:.4f}, marked={marked[i]}")
     
     # Save cell for inspection
-    cell_path = os.path.join(os.path.dirname(__file__), f'debug_cell_q1_c{i}.png')
-    cv2.imwrite(cell_path, cell)
+    cell_path = CELL_PATH_FORMAT.format(i)
+    cv2.imwrite(cell_path, binary[y:y+h, x:x+w])
 
 print(f"\nBinary image shape: {binary.shape}")
 print(f"Binary unique values: {np.unique(binary)}")
@@ -5,13 +5,19 @@ Run from repo root:
 
 This script generates a template, applies a perspective warp to simulate a scan,
 then attempts to detect alignment squares and warp it back.
+
+Options:
+    --skip-simulate   reuse the previously saved simulated_scanned.png
+    --fast            nearest-neighbour resampling for quick debugging runs
+    --rotate DEG      simulate a pure rotation by DEG degrees instead of the
+                      perspective perturbation (uses the cheaper affine warp)
 """
+import argparse
 import os
-import sys
+from functools import lru_cache
 import cv2
 import numpy as np
 
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 from exam_evaluator import PatternRecognizer
 
 ROOT = os.path.dirname(__file__)
@@ -20,8 +26,22 @@ SCANNED_PNG = os.path.join(ROOT, 'simulated_scanned.png')
 ALIGNED_PNG = os.path.join(ROOT, 'aligned_template.png')
 
 
-def simulate_scan(img: np.ndarray) -> np.ndarray:
-    h, w = img.shape[:2]
+@lru_cache(maxsize=None)
+def _scan_transform(w: int, h: int, angle: float = 0.0):
+    """
+    Transform used to simulate a scan of a w x h page.
+
+    A non-zero angle gives a pure rotation about the page center, which only
+    needs the cheaper affine warp. Otherwise the marker perturbation uses a
+    fixed seed, so the matrix only depends on the page size: it is computed
+    once and reused on every call.
+    Returns (M, is_affine) with M marked read-only.
+    """
+    if angle:
+        M = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), angle, 1.0)
+        M.setflags(write=False)
+        return M, True
+
     # Use the known alignment square centers from the template layout
     margin = 120
     sq = 120
@@ -40,25 +60,56 @@ def simulate_scan(img: np.ndarray) -> np.ndarray:
 
     # Compute perspective transform that maps template marker positions to perturbed positions
     M = cv2.getPerspectiveTransform(src, dst)
-    warped = cv2.warpPerspective(img, M, (w, h), flags=cv2.INTER_LINEAR)
+    M.setflags(write=False)
+    return M, False
+
+
+def simulate_scan(img: np.ndarray, interpolation: int = cv2.INTER_LINEAR,
+                  angle: float = 0.0) -> np.ndarray:
+    h, w = img.shape[:2]
+    M, is_affine = _scan_transform(w, h, angle)
+    # Transparent API: warp and blur stay on the OpenCL device when one is
+    # available (one upload, one download); otherwise UMat runs on the CPU
+    u_img = cv2.UMat(img)
+    if is_affine:
+        u_warped = cv2.warpAffine(u_img, M, (w, h), flags=interpolation)
+    else:
+        u_warped = cv2.warpPerspective(u_img, M, (w, h), flags=interpolation)
     # add slight blur to simulate scanner/phone capture
-    warped = cv2.GaussianBlur(warped, (3, 3), 0)
-    return warped
+    u_warped = cv2.GaussianBlur(u_warped, (3, 3), 0)
+    return u_warped.get()
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--skip-simulate', action='store_true',
+                        help='reuse the saved simulated scan instead of warping again')
+    parser.add_argument('--fast', action='store_true',
+                        help='use nearest-neighbour resampling (debugging only)')
+    parser.add_argument('--rotate', type=float, default=0.0, metavar='DEG',
+                        help='simulate a pure rotation by DEG degrees (affine warp)')
+    args = parser.parse_args()
+
     recognizer = PatternRecognizer()
 
-    if not os.path.exists(TEMPLATE_PNG):
-        print("Template not found — generating one first...")
-        img = recognizer.generate_exam_sheet_template(title='Demo Exam', num_questions=20)
-        cv2.imwrite(TEMPLATE_PNG, img)
+    if args.skip_simulate and os.path.exists(SCANNED_PNG):
+        scanned = cv2.imread(SCANNED_PNG)
+        print(f"Loaded simulated scanned image: {SCANNED_PNG}")
     else:
-        img = cv2.imread(TEMPLATE_PNG)
+        scanned = None
+
+    if scanned is None:
+        if not os.path.exists(TEMPLATE_PNG):
+            print("Template not found — generating one first...")
+            img = recognizer.generate_exam_sheet_template(title='Demo Exam', num_questions=20)
+            cv2.imwrite(TEMPLATE_PNG, img)
+        else:
+            img = cv2.imread(TEMPLATE_PNG)
 
-    scanned = simulate_scan(img)
-    cv2.imwrite(SCANNED_PNG, scanned)
-    print(f"Simulated scanned image saved to: {SCANNED_PNG}")
+        interpolation = cv2.INTER_NEAREST if args.fast else cv2.INTER_LINEAR
+        scanned = simulate_scan(img, interpolation, args.rotate)
+        cv2.imwrite(SCANNED_PNG, scanned)
+        print(f"Simulated scanned image saved to: {SCANNED_PNG}")
 
     aligned = recognizer.align_exam_image(scanned)
     if aligned is None:
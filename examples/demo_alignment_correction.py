@@ -10,12 +10,11 @@ Run from repo root:
     python3 examples/demo_alignment_correction.py
 """
 import os
-import sys
 import cv2
 import numpy as np
 
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 from exam_evaluator import PatternRecognizer
+from template_cache import load_or_generate_template
 
 OUT_DIR = os.path.dirname(__file__)
 
@@ -31,7 +30,9 @@ def main():
     num_questions = 10
     choices_per_question = 4
     
-    template = recognizer.generate_exam_sheet_template(
+    # The rendered template is cached on disk across runs
+    template, _ = load_or_generate_template(
+        recognizer,
         title="Test Exam",
         num_questions=num_questions,
         choices_per_question=choices_per_question,
@@ -42,19 +43,21 @@ def main():
     
     print("\n1. Generated template (800x1000)")
     
-    # Get cell coordinates and mark answers
-    cells = recognizer.extract_answer_cells(
-        template, num_questions, choices_per_question,
-        template_size=(800, 1000), margin=40, alignment_square_size=40
-    )
-    
+    # Mark answers
     filled_exam = template.copy()
     marked_answers = [0, 1, 2, 3, 0, 1, 2, 3, 0, 1]  # A, B, C, D, A, B, C, D, A, B
     
-    for q_idx, answer_idx in enumerate(marked_answers):
-        if q_idx < len(cells) and answer_idx < len(cells[q_idx]):
-            x, y, w, h = cells[q_idx][answer_idx]
-            cv2.circle(filled_exam, (x + w//2, y + h//2), min(w, h)//2 - 2, (0, 0, 0), -1)
+    xs, ys, ws, hs = recognizer.extract_answer_cell_arrays(
+        filled_exam, num_questions, choices_per_question
+    )
+    n_marks = min(len(marked_answers), num_questions)
+    questions, choices = np.arange(n_marks), marked_answers[:n_marks]
+    ws, hs = ws[questions, choices], hs[questions, choices]
+    centers_x = xs[questions, choices] + ws // 2
+    centers_y = ys[questions, choices] + hs // 2
+    radii = np.minimum(ws, hs) // 2 - 2
+    for cx, cy, r in zip(centers_x.tolist(), centers_y.tolist(), radii.tolist()):
+        cv2.circle(filled_exam, (cx, cy), r, (0, 0, 0), -1)
     
     print(f"2. Filled exam with answers: {['ABCD'[i] for i in marked_answers]}")
     
@@ -7,22 +7,56 @@ This example demonstrates:
 
 Run from repo root:
     python3 examples/demo_complete_workflow.py
+
+To process several scanned exams in parallel instead:
+    python3 examples/demo_complete_workflow.py scan1.png scan2.png ...
 """
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from multiprocessing import Pool
 import cv2
 import numpy as np
 
-# Ensure src is importable
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 from exam_evaluator import PatternRecognizer
+from output_settings import PNG_PARAMS
+from template_cache import load_or_generate_template
 
 OUT_DIR = os.path.dirname(__file__)
 
 
+def _init_worker():
+    # One process per core already saturates the CPU; OpenCV's own thread
+    # pool would only oversubscribe it
+    cv2.setNumThreads(1)
+
+
+def batch_process(paths, processes=None, **kwargs):
+    """
+    Run process_exam_sheet on many images using one worker process per core.
+    
+    Args:
+        paths: Image paths of scanned exams
+        processes: Number of worker processes (default: os.cpu_count())
+        **kwargs: Extra arguments forwarded to process_exam_sheet
+        
+    Returns:
+        List of result dictionaries, in the same order as paths
+    """
+    recognizer = PatternRecognizer()
+    worker = partial(recognizer.process_exam_sheet, **kwargs)
+    with Pool(processes=processes or os.cpu_count(), initializer=_init_worker) as pool:
+        # imap keeps input order while still streaming results as they finish
+        return list(pool.imap(worker, paths))
+
+
 def main():
     recognizer = PatternRecognizer()
     
+    # PNG encoding runs on background threads while the pipeline keeps going
+    io_pool = ThreadPoolExecutor(max_workers=2)
+    
     print("=" * 60)
     print("STEP 1: Generate exam template")
     print("=" * 60)
@@ -31,7 +65,9 @@ def main():
     num_questions = 10
     choices_per_question = 4
     
-    template = recognizer.generate_exam_sheet_template(
+    # The rendered template is cached on disk across runs
+    template, _ = load_or_generate_template(
+        recognizer,
         title="Sample Exam",
         num_questions=num_questions,
         choices_per_question=choices_per_question,
@@ -41,7 +77,7 @@ def main():
     )
     
     template_path = os.path.join(OUT_DIR, 'template.png')
-    cv2.imwrite(template_path, template)
+    template_saved = io_pool.submit(cv2.imwrite, template_path, template, PNG_PARAMS)
     print(f"✓ Template generated: {template_path}")
     print(f"  Questions: {num_questions}, Choices: {choices_per_question}")
     
@@ -51,28 +87,30 @@ def main():
     
     # Simulate a student filling out the exam
     # Mark answers: Q1=A, Q2=C, Q3=B, Q4=D, Q5=A, Q6=B, Q7=C, Q8=A, Q9=D, Q10=B
-    filled_exam = template.copy()
-    
-    # Get cell coordinates
-    cells = recognizer.extract_answer_cells(
-        filled_exam, num_questions, choices_per_question,
-        template_size=(800, 1000), margin=40, alignment_square_size=40
-    )
+    # The template is not needed again, so mark it in place once it is saved
+    template_saved.result()
+    filled_exam = template
     
     # Simulate marking (fill in some cells)
     marked_answers = [0, 2, 1, 3, 0, 1, 2, 0, 3, 1]  # A, C, B, D, A, B, C, A, D, B
     
-    for q_idx, answer_idx in enumerate(marked_answers):
-        if q_idx < len(cells) and answer_idx < len(cells[q_idx]):
-            x, y, w, h = cells[q_idx][answer_idx]
-            # Draw a filled circle to simulate student marking
-            center_x = x + w // 2
-            center_y = y + h // 2
-            radius = min(w, h) // 2 - 2  # Larger mark
-            cv2.circle(filled_exam, (center_x, center_y), radius, (0, 0, 0), -1)
+    # Compute every mark's center and radius at once from the cell grid
+    xs, ys, ws, hs = recognizer.extract_answer_cell_arrays(
+        filled_exam, num_questions, choices_per_question
+    )
+    n_marks = min(len(marked_answers), num_questions)
+    questions, choices = np.arange(n_marks), marked_answers[:n_marks]
+    ws, hs = ws[questions, choices], hs[questions, choices]
+    centers_x = xs[questions, choices] + ws // 2
+    centers_y = ys[questions, choices] + hs // 2
+    radii = np.minimum(ws, hs) // 2 - 2  # Larger mark
+
+    # Draw a filled circle per mark to simulate student marking
+    for center_x, center_y, radius in zip(centers_x.tolist(), centers_y.tolist(), radii.tolist()):
+        cv2.circle(filled_exam, (center_x, center_y), radius, (0, 0, 0), -1)
     
     filled_path = os.path.join(OUT_DIR, 'filled_exam.png')
-    cv2.imwrite(filled_path, filled_exam)
+    filled_saved = io_pool.submit(cv2.imwrite, filled_path, filled_exam, PNG_PARAMS)
     print(f"✓ Filled exam created: {filled_path}")
     print(f"  Marked answers: {['ABCD'[i] for i in marked_answers]}")
     
@@ -80,7 +118,8 @@ def main():
     print("STEP 3: Process exam sheet (detect answers)")
     print("=" * 60)
     
-    # Process the filled exam
+    # Process the filled exam (it is read back from disk, so wait for the write)
+    filled_saved.result()
     result = recognizer.process_exam_sheet(
         filled_path,
         num_questions=num_questions,
@@ -95,34 +134,48 @@ def main():
         print(f"✓ Processing successful!")
         print(f"\nDetected answers:")
         detected = result['answers']
+        # Build the whole report first and write it with a single print
+        lines = []
         for i, answer in enumerate(detected):
             question_num = i + 1
             if answer is not None:
                 answer_letter = 'ABCD'[answer]
                 expected_letter = 'ABCD'[marked_answers[i]]
                 match = "✓" if answer == marked_answers[i] else "✗"
-                print(f"  Q{question_num}: {answer_letter} (expected: {expected_letter}) {match}")
+                lines.append(f"  Q{question_num}: {answer_letter} (expected: {expected_letter}) {match}")
             else:
-                print(f"  Q{question_num}: INVALID (no answer or multiple answers marked)")
+                lines.append(f"  Q{question_num}: INVALID (no answer or multiple answers marked)")
+        print("\n".join(lines))
         
         # Save aligned image
         aligned_path = os.path.join(OUT_DIR, 'aligned_exam.png')
-        cv2.imwrite(aligned_path, result['aligned_image'])
+        io_pool.submit(cv2.imwrite, aligned_path, result['aligned_image'], PNG_PARAMS)
         print(f"\n✓ Aligned image saved: {aligned_path}")
         
         # Also save binary version for inspection
         binary = recognizer.convert_to_black_and_white(result['aligned_image'])
         binary_path = os.path.join(OUT_DIR, 'binary_exam.png')
-        cv2.imwrite(binary_path, binary)
+        io_pool.submit(cv2.imwrite, binary_path, binary, PNG_PARAMS)
         print(f"✓ Binary image saved: {binary_path}")
         
     else:
         print(f"✗ Processing failed: {result['error']}")
     
+    # Make sure every image is on disk before reporting completion
+    io_pool.shutdown(wait=True)
+    
     print("\n" + "=" * 60)
     print("WORKFLOW COMPLETE")
     print("=" * 60)
 
 
 if __name__ == '__main__':
-    main()
+    if len(sys.argv) > 1:
+        for path, result in zip(sys.argv[1:], batch_process(sys.argv[1:])):
+            if result['success']:
+                answers = ['ABCD'[a] if a is not None else '-' for a in result['answers']]
+                print(f"{path}: {' '.join(answers)}")
+            else:
+                print(f"{path}: ✗ {result['error']}")
+    else:
+        main()
@@ -10,11 +10,9 @@ Ejecutar desde la raíz del repositorio:
     python3 examples/demo_flujo_completo_espanol.py
 """
 import os
-import sys
 import cv2
+import numpy as np
 
-# Asegurar que src sea importable
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 from exam_evaluator import ReconocedorRespuestas, GeneradorPlantillas
 
 DIR_SALIDA = os.path.dirname(__file__)
@@ -63,14 +61,16 @@ def main():
     # Simular marcado (rellenar algunas celdas)
     respuestas_marcadas = [0, 2, 1, 3, 0, 1, 2, 0, 3, 1]  # A, C, B, D, A, B, C, A, D, B
     
-    for idx_p, idx_resp in enumerate(respuestas_marcadas):
-        if idx_p < len(celdas) and idx_resp < len(celdas[idx_p]):
-            x, y, w, h = celdas[idx_p][idx_resp]
-            # Dibujar un círculo relleno para simular marca de estudiante
-            centro_x = x + w // 2
-            centro_y = y + h // 2
-            radio = min(w, h) // 2 - 2
-            cv2.circle(examen_rellenado, (centro_x, centro_y), radio, (0, 0, 0), -1)
+    # Calcular de una vez el centro y radio de cada marca a partir de la cuadricula de celdas
+    n_marcas = min(len(respuestas_marcadas), len(celdas))
+    seleccion = np.asarray(celdas, dtype=np.int32)[np.arange(n_marcas), respuestas_marcadas[:n_marcas]]
+    centros_x = seleccion[:, 0] + seleccion[:, 2] // 2
+    centros_y = seleccion[:, 1] + seleccion[:, 3] // 2
+    radios = np.minimum(seleccion[:, 2], seleccion[:, 3]) // 2 - 2
+
+    # Dibujar un círculo relleno por marca para simular marca de estudiante
+    for centro_x, centro_y, radio in zip(centros_x.tolist(), centros_y.tolist(), radios.tolist()):
+        cv2.circle(examen_rellenado, (centro_x, centro_y), radio, (0, 0, 0), -1)
     
     ruta_rellenado = os.path.join(DIR_SALIDA, 'examen_rellenado_espanol.png')
     cv2.imwrite(ruta_rellenado, examen_rellenado)
@@ -97,15 +97,18 @@ def main():
         print(f"✓ ¡Procesamiento exitoso!")
         print(f"\nRespuestas detectadas:")
         detectadas = resultado['respuestas']
+        # Construir el reporte completo y escribirlo con un solo print
+        lineas = []
         for i, respuesta in enumerate(detectadas):
             num_pregunta = i + 1
             if respuesta is not None:
                 letra_respuesta = 'ABCD'[respuesta]
                 letra_esperada = 'ABCD'[respuestas_marcadas[i]]
                 coincide = "✓" if respuesta == respuestas_marcadas[i] else "✗"
-                print(f"  P{num_pregunta}: {letra_respuesta} (esperada: {letra_esperada}) {coincide}")
+                lineas.append(f"  P{num_pregunta}: {letra_respuesta} (esperada: {letra_esperada}) {coincide}")
             else:
-                print(f"  P{num_pregunta}: INVÁLIDA (sin respuesta o múltiples respuestas marcadas)")
+                lineas.append(f"  P{num_pregunta}: INVÁLIDA (sin respuesta o múltiples respuestas marcadas)")
+        print("\n".join(lineas))
         
         # Guardar imagen sin sombras (si está disponible)
         if resultado['imagen_sin_sombras'] is not None:
@@ -4,19 +4,28 @@ This example demonstrates the system correctly handling invalid cases
 where a student marks more than one answer for a question.
 
 Run from repo root:
-    python3 examples/demo_invalid_answers.py
+    python3 examples/demo_invalid_answers.py [--save]
+
+The filled exam is processed directly from memory; pass --save to also
+write it to test_invalid.png.
 """
+import argparse
 import os
-import sys
 import cv2
+import numpy as np
 
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 from exam_evaluator import PatternRecognizer
+from output_settings import PNG_PARAMS
 
 OUT_DIR = os.path.dirname(__file__)
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--save', action='store_true',
+                        help='also write the filled exam to test_invalid.png')
+    args = parser.parse_args()
+
     recognizer = PatternRecognizer()
     
     print("=" * 60)
@@ -51,33 +60,43 @@ def main():
     
     filled_exam = template.copy()
     
+    # Filled-circle stencils, rasterized once per radius and stamped into each
+    # marked cell (cells share their size, so usually a single stencil is built)
+    stencils = {}
+    
+    def mark(question_idx, choice_idx):
+        x, y, w, h = cells[question_idx][choice_idx]
+        cx, cy, r = x + w // 2, y + h // 2, min(w, h) // 2 - 2
+        if r not in stencils:
+            patch = np.zeros((2 * r + 1, 2 * r + 1), dtype=np.uint8)
+            cv2.circle(patch, (r, r), r, 255, -1)
+            stencils[r] = patch.astype(bool)
+        filled_exam[cy - r:cy + r + 1, cx - r:cx + r + 1][stencils[r]] = 0
+    
     # Q1: Mark A only
-    x, y, w, h = cells[0][0]
-    cv2.circle(filled_exam, (x + w//2, y + h//2), min(w, h)//2 - 2, (0, 0, 0), -1)
+    mark(0, 0)
     
     # Q2: Mark both A and C
-    x, y, w, h = cells[1][0]
-    cv2.circle(filled_exam, (x + w//2, y + h//2), min(w, h)//2 - 2, (0, 0, 0), -1)
-    x, y, w, h = cells[1][2]
-    cv2.circle(filled_exam, (x + w//2, y + h//2), min(w, h)//2 - 2, (0, 0, 0), -1)
+    mark(1, 0)
+    mark(1, 2)
     
     # Q3: Mark D only
-    x, y, w, h = cells[2][3]
-    cv2.circle(filled_exam, (x + w//2, y + h//2), min(w, h)//2 - 2, (0, 0, 0), -1)
+    mark(2, 3)
     
     # Q4: Don't mark anything (already blank)
     
     # Q5: Mark all answers
     for choice_idx in range(choices_per_question):
-        x, y, w, h = cells[4][choice_idx]
-        cv2.circle(filled_exam, (x + w//2, y + h//2), min(w, h)//2 - 2, (0, 0, 0), -1)
+        mark(4, choice_idx)
     
-    # Save filled exam
-    filled_path = os.path.join(OUT_DIR, 'test_invalid.png')
-    cv2.imwrite(filled_path, filled_exam)
-    print(f"\nTest exam created: {filled_path}")
+    # Save filled exam only when requested
+    filled_path = None
+    if args.save:
+        filled_path = os.path.join(OUT_DIR, 'test_invalid.png')
+        cv2.imwrite(filled_path, filled_exam, PNG_PARAMS)
+        print(f"\nTest exam created: {filled_path}")
     
-    # Process the filled exam
+    # Process the filled exam straight from memory (no PNG round-trip)
     result = recognizer.process_exam_sheet(
         filled_path,
         num_questions=num_questions,
@@ -85,7 +104,8 @@ def main():
         template_size=(800, 1000),
         margin=40,
         alignment_square_size=40,
-        mark_threshold=0.15
+        mark_threshold=0.15,
+        image=filled_exam
     )
     
     print("\nResults:")
@@ -4,13 +4,11 @@ Run from repo root:
     python3 examples/generate_exam_sheet.py
 """
 import os
-import sys
 import cv2
 import numpy as np
 
-# Ensure src is importable
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 from exam_evaluator import PatternRecognizer
+from output_settings import PNG_PARAMS
 
 OUT = os.path.join(os.path.dirname(__file__), 'generated_template.png')
 
@@ -23,8 +21,8 @@ def main():
         choices_per_question=4,
         sheet_size=(1400, 2000),
     )
-    # Save as PNG
-    cv2.imwrite(OUT, img)
+    # Save as PNG (fast compression level, see output_settings)
+    cv2.imwrite(OUT, img, PNG_PARAMS)
     print(f"Generated template saved to: {OUT}")
 
 
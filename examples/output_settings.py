@@ -0,0 +1,9 @@
+"""
+Settings shared by the example scripts that write images.
+"""
+
+import cv2
+
+# Level 1 is much faster than the default level 3 and compresses these
+# near-binary line-art sheets almost as well
+PNG_PARAMS = [cv2.IMWRITE_PNG_COMPRESSION, 1]
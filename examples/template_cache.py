@@ -0,0 +1,94 @@
+"""
+Disk cache for generated exam templates and their cell geometry.
+
+Demo and debug scripts regenerate the same template with the same parameters
+on every run. This helper stores the rendered template and the cell
+coordinates under examples/.cache/<source hash>/<parameter hash>/ and
+reloads them on later runs. The source hash covers both library modules that
+define the layout (including module-level constants and helpers), so editing
+the library invalidates stale entries automatically; entries left behind by
+older sources are deleted the next time a template is written.
+"""
+
+import hashlib
+import inspect
+import os
+import shutil
+import cv2
+import numpy as np
+
+from exam_evaluator import generador_plantillas
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+
+def _source_key(recognizer):
+    """Hash the sources of the modules that draw the template and compute its layout."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(inspect.getsource(inspect.getmodule(type(recognizer))).encode('utf-8'))
+    # PatternRecognizer delegates the drawing to GeneradorPlantillas
+    digest.update(inspect.getsource(generador_plantillas).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _params_key(params):
+    """Hash the template parameters."""
+    return hashlib.blake2b(repr(sorted(params.items())).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _prune_stale_entries(source_key):
+    """Delete the entries written by other versions of the library sources."""
+    for name in os.listdir(CACHE_DIR):
+        if name != source_key:
+            shutil.rmtree(os.path.join(CACHE_DIR, name), ignore_errors=True)
+
+
+def load_or_generate_template(recognizer, title="Exam", num_questions=10, choices_per_question=4,
+                              sheet_size=(800, 1000), margin=40, alignment_square_size=40):
+    """
+    Return (template, cells) for the given parameters, generating them only once.
+
+    Args:
+        recognizer: PatternRecognizer instance used on a cache miss
+        title: Exam title printed on the template
+        num_questions: Number of questions (columns)
+        choices_per_question: Number of options per question (rows)
+        sheet_size: (width, height) of the template in pixels
+        margin: Margin in pixels
+        alignment_square_size: Side length of the corner alignment squares
+
+    Returns:
+        Tuple of (template image, cells as list of lists of (x, y, w, h))
+    """
+    params = {
+        'title': title,
+        'num_questions': num_questions,
+        'choices_per_question': choices_per_question,
+        'sheet_size': tuple(sheet_size),
+        'margin': margin,
+        'alignment_square_size': alignment_square_size,
+    }
+    source_key = _source_key(recognizer)
+    entry_dir = os.path.join(CACHE_DIR, source_key, _params_key(params))
+    template_path = os.path.join(entry_dir, 'template.png')
+    cells_path = os.path.join(entry_dir, 'cells.npz')
+
+    if os.path.exists(template_path) and os.path.exists(cells_path):
+        template = cv2.imread(template_path)
+        if template is not None:
+            with np.load(cells_path) as data:
+                cells = [[tuple(cell) for cell in row] for row in data['cells'].tolist()]
+            return template, cells
+
+    template = recognizer.generate_exam_sheet_template(**params)
+    cells = recognizer.extract_answer_cells(
+        template, num_questions, choices_per_question,
+        template_size=params['sheet_size'], margin=margin,
+        alignment_square_size=alignment_square_size
+    )
+
+    os.makedirs(entry_dir, exist_ok=True)
+    _prune_stale_entries(source_key)
+    cv2.imwrite(template_path, template)
+    np.savez(cells_path, cells=np.asarray(cells, dtype=np.int32))
+    return template, cells
@@ -5,8 +5,12 @@ Este módulo proporciona capacidades de generación de plantillas de hojas de re
 
 import cv2
 import numpy as np
+from functools import lru_cache
 from typing import Tuple
 
+# Etiquetas de las opciones (filas); a partir de la 27 se numeran
+_LETRAS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
 
 class GeneradorPlantillas:
     """
@@ -16,9 +20,8 @@ class GeneradorPlantillas:
     de respuestas con marcadores de alineación y cuadrículas de respuestas.
     """
     
-    def __init__(self):
-        """Inicializar el GeneradorPlantillas."""
-        self.opencv_version = cv2.__version__
+    # Versión de OpenCV en uso (atributo de clase: es igual para todas las instancias)
+    opencv_version = cv2.__version__
     
     def generar_plantilla_hoja_examen(
         self,
@@ -29,6 +32,8 @@ class GeneradorPlantillas:
         margen: int = 40,
         tamano_cuadrado_alineacion: int = 40,
         tamano_qr: int = 200,
+        etiqueta_nombre: str = "Nombre:",
+        etiqueta_codigo: str = "Código:",
     ) -> np.ndarray:
         """
         Generar una plantilla de hoja de respuestas de examen imprimible en blanco.
@@ -49,39 +54,78 @@ class GeneradorPlantillas:
             margen: Margen exterior en píxeles
             tamano_cuadrado_alineacion: Tamaño en píxeles de los cuadrados de alineación
             tamano_qr: Tamaño en píxeles del cuadrado marcador de posición QR
+            etiqueta_nombre: Texto del cuadro del nombre del estudiante
+            etiqueta_codigo: Texto del cuadro del código del estudiante
 
         Returns:
             Una imagen numpy BGR (uint8) con la plantilla dibujada
         """
+        # La plantilla es determinista: se dibuja una vez por combinación de
+        # parámetros y cada llamada recibe su propia copia modificable
+        return self._dibujar_plantilla(
+            titulo, num_preguntas, opciones_por_pregunta, tuple(tamano_hoja),
+            margen, tamano_cuadrado_alineacion, tamano_qr, etiqueta_nombre, etiqueta_codigo
+        ).copy()
+
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def _dibujar_plantilla(
+        titulo: str,
+        num_preguntas: int,
+        opciones_por_pregunta: int,
+        tamano_hoja: Tuple[int, int],
+        margen: int,
+        tamano_cuadrado_alineacion: int,
+        tamano_qr: int,
+        etiqueta_nombre: str,
+        etiqueta_codigo: str,
+    ) -> np.ndarray:
+        """
+        Dibujar la plantilla (ver generar_plantilla_hoja_examen).
+
+        El resultado se guarda en caché y se marca como de solo lectura para que
+        ningún llamador pueda modificar la copia compartida.
+        """
         ancho, alto = tamano_hoja
-        img = np.ones((alto, ancho, 3), dtype=np.uint8) * 255
+        # La plantilla es monocroma: se dibuja sobre un lienzo de un solo canal
+        # (un tercio de escrituras por cada llamada de dibujo) y se convierte a BGR al final
+        img = np.full((alto, ancho), 255, dtype=np.uint8)
+        fuente = cv2.FONT_HERSHEY_SIMPLEX
 
         # Título
         escala_titulo = 1.2
         grosor_titulo = 2
-        fuente_titulo = cv2.FONT_HERSHEY_SIMPLEX
+        fuente_titulo = fuente
         (t_w, t_h), _ = cv2.getTextSize(titulo, fuente_titulo, escala_titulo, grosor_titulo)
         titulo_x = (ancho - t_w) // 2
         titulo_y = margen + t_h
-        cv2.putText(img, titulo, (titulo_x, titulo_y), fuente_titulo, escala_titulo, (0, 0, 0), grosor_titulo, cv2.LINE_AA)
-
-        # Dibujar marcadores de alineación estilo buscador QR (cuadrados anidados) en las cuatro esquinas
-        def dibujar_buscador(x, y, size):
-            # exterior negro
-            cv2.rectangle(img, (int(x), int(y)), (int(x + size), int(y + size)), (0, 0, 0), -1)
-            # interior blanco
-            inset1 = int(size * 0.18)
-            cv2.rectangle(img, (int(x + inset1), int(y + inset1)), (int(x + size - inset1), int(y + size - inset1)), (255, 255, 255), -1)
-            # centro negro
-            inset2 = int(size * 0.36)
-            cv2.rectangle(img, (int(x + inset2), int(y + inset2)), (int(x + size - inset2), int(y + size - inset2)), (0, 0, 0), -1)
+        cv2.putText(img, titulo, (titulo_x, titulo_y), fuente_titulo, escala_titulo, 0, grosor_titulo, cv2.LINE_AA)
 
+        # Dibujar marcadores de alineación estilo buscador QR (cuadrados anidados) en las cuatro esquinas.
+        # Los cuatro buscadores son idénticos: el patrón se dibuja una sola vez y se copia
+        # en cada esquina. Un rectángulo relleno cubre size + 1 píxeles por lado.
         sq = tamano_cuadrado_alineacion
+        patron_buscador = np.zeros((sq + 1, sq + 1), dtype=np.uint8)  # exterior negro
+        # interior blanco
+        inset1 = int(sq * 0.18)
+        cv2.rectangle(patron_buscador, (inset1, inset1), (sq - inset1, sq - inset1), 255, -1)
+        # centro negro
+        inset2 = int(sq * 0.36)
+        cv2.rectangle(patron_buscador, (inset2, inset2), (sq - inset2, sq - inset2), 0, -1)
+
+        def dibujar_buscador(x, y):
+            x, y = int(x), int(y)
+            # recortar a los bordes de la imagen como lo haría cv2.rectangle
+            x0, y0 = max(x, 0), max(y, 0)
+            x1, y1 = min(x + sq + 1, ancho), min(y + sq + 1, alto)
+            if x0 < x1 and y0 < y1:
+                img[y0:y1, x0:x1] = patron_buscador[y0 - y:y1 - y, x0 - x:x1 - x]
+
         # colocarlos en los márgenes pero asegurar que el área de la tabla los evite
-        dibujar_buscador(margen, margen, sq)  # superior-izquierda
-        dibujar_buscador(ancho - margen - sq, margen, sq)  # superior-derecha
-        dibujar_buscador(margen, alto - margen - sq, sq)  # inferior-izquierda
-        dibujar_buscador(ancho - margen - sq, alto - margen - sq, sq)  # inferior-derecha
+        dibujar_buscador(margen, margen)  # superior-izquierda
+        dibujar_buscador(ancho - margen - sq, margen)  # superior-derecha
+        dibujar_buscador(margen, alto - margen - sq)  # inferior-izquierda
+        dibujar_buscador(ancho - margen - sq, alto - margen - sq)  # inferior-derecha
 
         # Celdas de Nombre del Estudiante y Código (celdas individuales) bajo el título
         parte_superior_cuadro = titulo_y + 15
@@ -99,11 +143,11 @@ class GeneradorPlantillas:
         izquierda_codigo = derecha_nombre + 8
         derecha_codigo = izquierda_codigo + codigo_w
 
-        cv2.rectangle(img, (izquierda_nombre, parte_superior_cuadro), (derecha_nombre, parte_superior_cuadro + altura_cuadro), (0, 0, 0), 2)
-        cv2.putText(img, "Nombre:", (izquierda_nombre + 8, parte_superior_cuadro + 28), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+        cv2.rectangle(img, (izquierda_nombre, parte_superior_cuadro), (derecha_nombre, parte_superior_cuadro + altura_cuadro), 0, 2)
+        cv2.putText(img, etiqueta_nombre, (izquierda_nombre + 8, parte_superior_cuadro + 28), fuente, 0.5, 0, 1)
 
-        cv2.rectangle(img, (izquierda_codigo, parte_superior_cuadro), (derecha_codigo, parte_superior_cuadro + altura_cuadro), (0, 0, 0), 2)
-        cv2.putText(img, "Código:", (izquierda_codigo + 8, parte_superior_cuadro + 28), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+        cv2.rectangle(img, (izquierda_codigo, parte_superior_cuadro), (derecha_codigo, parte_superior_cuadro + altura_cuadro), 0, 2)
+        cv2.putText(img, etiqueta_codigo, (izquierda_codigo + 8, parte_superior_cuadro + 28), fuente, 0.5, 0, 1)
 
         # Tabla de preguntas: las opciones son filas, las preguntas son columnas
         parte_superior_tabla = parte_superior_cuadro + altura_cuadro + 20
@@ -133,45 +177,62 @@ class GeneradorPlantillas:
         area_q_w = tabla_w - ancho_col_etiqueta
         ancho_celda = area_q_w / n_cols
 
-        # Dibujar tabla: primero dibujar fila de encabezado con números de pregunta. Dibujamos primero la columna de etiquetas.
-        # Dibujar encabezado de columna de etiquetas (vacío)
+        # Bordes de columnas y filas de la tabla. Las celdas están vacías, así que la
+        # cuadrícula se dibuja con una línea por borde en lugar de un rectángulo por celda
         lbl_x1 = izquierda_tabla
         lbl_x2 = izquierda_tabla + ancho_col_etiqueta
-        cv2.rectangle(img, (lbl_x1, parte_superior_tabla), (lbl_x2, parte_superior_tabla + encabezado_h), (0, 0, 0), 1)
-
+        # Los bordes se calculan con una sola operación NumPy por eje; astype(int) trunca
+        # igual que int() y tolist() devuelve los enteros de Python que esperan las llamadas de dibujo
+        xs = (izquierda_tabla + ancho_col_etiqueta + np.arange(n_cols + 1) * ancho_celda).astype(int).tolist()
+        encabezado_y1 = parte_superior_tabla
+        encabezado_y2 = parte_superior_tabla + encabezado_h
+        ys = (encabezado_y2 + np.arange(n_filas_opciones + 1) * fila_opcion_h).tolist()
+
+        # Cada orientación se dibuja con una sola llamada a polylines: un arreglo (N, 2, 2)
+        # de segmentos de dos puntos, que produce exactamente los mismos píxeles que cv2.line
+        # Líneas verticales: columna de etiquetas y bordes de cada pregunta (encabezado + opciones)
+        bordes_x = [lbl_x1] + xs
+        verticales = np.empty((len(bordes_x), 2, 2), dtype=np.int32)
+        verticales[:, :, 0] = np.array(bordes_x)[:, None]
+        verticales[:, 0, 1] = parte_superior_tabla
+        verticales[:, 1, 1] = parte_inferior_tabla
+        cv2.polylines(img, verticales, False, 0, 1)
+        # Líneas horizontales: borde superior del encabezado y bordes de cada fila de opciones.
+        # Cubren la unión de la columna de etiquetas y de las columnas de preguntas
+        # (en hojas muy pequeñas el área de preguntas puede quedar con ancho negativo)
+        bordes_y = [encabezado_y1] + ys
+        horizontales = np.empty((len(bordes_y), 2, 2), dtype=np.int32)
+        horizontales[:, 0, 0] = min(lbl_x1, xs[-1])
+        horizontales[:, 1, 0] = max(lbl_x2, xs[-1])
+        horizontales[:, :, 1] = np.array(bordes_y)[:, None]
+        cv2.polylines(img, horizontales, False, 0, 1)
+
+        # Números de pregunta centrados en las celdas de encabezado.
+        # Los dígitos Hershey tienen todos el mismo ancho, así que el tamaño del
+        # texto solo depende de la cantidad de dígitos: se calcula una vez por longitud
+        tamanos_numero = {}
         for col in range(n_cols):
-            col_x1 = int(izquierda_tabla + ancho_col_etiqueta + col * ancho_celda)
-            col_x2 = int(izquierda_tabla + ancho_col_etiqueta + (col + 1) * ancho_celda)
-            # celda de encabezado
-            encabezado_y1 = parte_superior_tabla
-            encabezado_y2 = parte_superior_tabla + encabezado_h
-            cv2.rectangle(img, (col_x1, encabezado_y1), (col_x2, encabezado_y2), (0, 0, 0), 1)
-            num_pregunta = col + 1
-            # centrar número de pregunta en celda de encabezado
-            (qw, qh), _ = cv2.getTextSize(str(num_pregunta), cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+            col_x1 = xs[col]
+            col_x2 = xs[col + 1]
+            texto_pregunta = str(col + 1)
+            digitos = len(texto_pregunta)
+            if digitos not in tamanos_numero:
+                tamanos_numero[digitos] = cv2.getTextSize("8" * digitos, fuente, 0.5, 1)[0]
+            qw, qh = tamanos_numero[digitos]
             qx = col_x1 + (col_x2 - col_x1 - qw) // 2
             qy = encabezado_y1 + (encabezado_h + qh) // 2
-            cv2.putText(img, str(num_pregunta), (qx, qy), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
-
-            # dibujar filas de opciones
-            for fila in range(n_filas_opciones):
-                fila_y1 = encabezado_y2 + fila * fila_opcion_h
-                fila_y2 = encabezado_y2 + (fila + 1) * fila_opcion_h
-                cv2.rectangle(img, (col_x1, fila_y1), (col_x2, fila_y2), (0, 0, 0), 1)
+            cv2.putText(img, texto_pregunta, (qx, qy), fuente, 0.5, 0, 1)
 
-                # Sin círculo: los estudiantes pueden marcar celdas de diferentes maneras; dejar celda vacía
-                # Opcionalmente dibujar un cuadro guía interior muy ligero (deshabilitado por defecto)
-                # cx = int((col_x1 + col_x2) / 2)
-                # cy = int((fila_y1 + fila_y2) / 2)
-                # cv2.rectangle(img, (cx-8, cy-8), (cx+8, cy+8), (0,0,0), 1)
+        # Sin círculo: los estudiantes pueden marcar celdas de diferentes maneras; dejar celda vacía
 
-        # Dibujar filas de columna de etiquetas y etiquetas
+        # Etiquetas de opciones en la columna izquierda
         for fila in range(n_filas_opciones):
-            fila_y1 = parte_superior_tabla + encabezado_h + fila * fila_opcion_h
-            fila_y2 = parte_superior_tabla + encabezado_h + (fila + 1) * fila_opcion_h
-            cv2.rectangle(img, (lbl_x1, fila_y1), (lbl_x2, fila_y2), (0, 0, 0), 1)
-            etiqueta = chr(ord('A') + fila) if fila < 26 else str(fila + 1)
+            fila_y1 = ys[fila]
+            fila_y2 = ys[fila + 1]
+            etiqueta = _LETRAS[fila] if fila < 26 else str(fila + 1)
             cy = int((fila_y1 + fila_y2) / 2)
-            cv2.putText(img, etiqueta, (lbl_x1 + 8, cy + int(fila_opcion_h * 0.15)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+            cv2.putText(img, etiqueta, (lbl_x1 + 8, cy + int(fila_opcion_h * 0.15)), fuente, 0.5, 0, 1)
 
-        return img
+        plantilla = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        plantilla.flags.writeable = False
+        return plantilla
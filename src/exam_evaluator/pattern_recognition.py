@@ -12,10 +12,30 @@ OPTIMIZATIONS IMPLEMENTED:
 - Internal helper methods (_to_gray) for efficient code reuse
 """
 
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
+from functools import lru_cache
 from typing import Tuple, List, Optional
 
+from .generador_plantillas import GeneradorPlantillas
+
+# Height of the template title text. getTextSize reports the same height for any
+# string at a given Hershey font and scale, so it is measured once at import
+_TITLE_HEIGHT = cv2.getTextSize("Exam", cv2.FONT_HERSHEY_SIMPLEX, 1.2, 2)[0][1]
+
+# Every way of picking one of its 4 nearest candidates for each of the 4 corners,
+# shape (256, 4); used by _select_nearest_markers
+_CORNER_COMBINATIONS = np.array(list(itertools.product(range(4), repeat=4)))
+
+# Structuring element used by remove_shadows to estimate the paper background
+_SHADOW_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (20, 20))
+
+# Structuring element for the morphological closing in find_alignment_squares
+_CLOSE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+
 
 class PatternRecognizer:
     """
@@ -25,21 +45,25 @@ class PatternRecognizer:
     in exam images for automated evaluation.
     """
     
-    def __init__(self):
-        """Initialize the PatternRecognizer."""
-        self.opencv_version = cv2.__version__
+    # OpenCV version in use (class attribute: identical for every instance)
+    opencv_version = cv2.__version__
     
-    def load_image(self, image_path: str) -> Optional[np.ndarray]:
+    def load_image(self, image_path: str, grayscale: bool = False) -> Optional[np.ndarray]:
         """
         Load an image from the specified path.
         
         Args:
             image_path: Path to the image file
+            grayscale: If True, decode directly to a single channel. This skips
+                the BGR buffer and a later conversion (JPEG decoders also skip
+                the chroma planes), so it is faster when color is not needed.
+                For color JPEGs the result can differ slightly from converting
+                the BGR image with cvtColor
             
         Returns:
             The loaded image as a numpy array, or None if loading fails
         """
-        image = cv2.imread(image_path)
+        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR)
         if image is None:
             print(f"Error: Could not load image from {image_path}")
             return None
@@ -52,11 +76,19 @@ class PatternRecognizer:
         Optimization: Avoids redundant conversion if image is already grayscale.
         
         Args:
-            image: Input image (BGR or already grayscale)
+            image: Input image (BGR or already grayscale), ndarray or cv2.UMat
             
         Returns:
             Grayscale image
         """
+        if isinstance(image, cv2.UMat):
+            # A UMat does not expose its shape. cvtColor checks the channel
+            # count on the host before touching the data, so a gray UMat is
+            # recognized by its error without downloading it
+            try:
+                return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            except cv2.error:
+                return image
         if len(image.shape) == 2:
             return image
         return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
@@ -93,6 +125,10 @@ class PatternRecognizer:
         """
         Detect edges in an image using Canny edge detection.
         
+        Note: Canny computes its Sobel gradients internally as int16 (CV_16S),
+        already half the size of a float32 gradient, and cv2.Sobel has no
+        float16 kernel type, so there is no cheaper precision to opt into.
+        
         Args:
             image: Input grayscale image
             low_threshold: Lower threshold for edge detection
@@ -120,14 +156,20 @@ class PatternRecognizer:
         return contours, hierarchy
     
     def detect_circles(self, image: np.ndarray, min_radius: int = 10, 
-                       max_radius: int = 100) -> Optional[np.ndarray]:
+                       max_radius: int = 100, dp: float = 1,
+                       min_dist: float = 20) -> Optional[np.ndarray]:
         """
         Detect circles in an image using Hough Circle Transform.
         
+        The accumulator cost grows with the radius range, so pass the tightest
+        range the known bubble size allows.
+        
         Args:
             image: Input grayscale image
             min_radius: Minimum circle radius
             max_radius: Maximum circle radius
+            dp: Inverse accumulator resolution (1 = full resolution)
+            min_dist: Minimum distance between detected circle centers
             
         Returns:
             Array of detected circles (x, y, radius) or None
@@ -135,8 +177,8 @@ class PatternRecognizer:
         circles = cv2.HoughCircles(
             image,
             cv2.HOUGH_GRADIENT,
-            dp=1,
-            minDist=20,
+            dp=dp,
+            minDist=min_dist,
             param1=50,
             param2=30,
             minRadius=min_radius,
@@ -144,6 +186,42 @@ class PatternRecognizer:
         )
         return circles
     
+    def detect_filled_circles(self, binary_image: np.ndarray, min_radius: int = 10,
+                              max_radius: int = 100) -> Optional[np.ndarray]:
+        """
+        Detect filled dark circles (OMR bubbles) with connected components.
+        
+        On a binary sheet a filled bubble is one blob of ink, so a single
+        labelling pass replaces the Hough accumulator of detect_circles, whose
+        cost grows with the radius range. Blobs are kept when their area
+        fits the radius range and their bounding box is roughly square without
+        being filled edge to edge (a disk covers about 79% of it, which rejects
+        square markers).
+        
+        Args:
+            binary_image: Binary image with dark (0) ink on a white background
+            min_radius: Minimum circle radius
+            max_radius: Maximum circle radius
+            
+        Returns:
+            Array of detected circles (x, y, radius) in the layout returned by
+            detect_circles, with the radius derived from the blob area, or None
+        """
+        _, _, stats, centroids = cv2.connectedComponentsWithStats(
+            cv2.bitwise_not(binary_image), connectivity=8, ltype=cv2.CV_32S
+        )
+        # Label 0 is the background
+        stats, centroids = stats[1:], centroids[1:]
+        area = stats[:, cv2.CC_STAT_AREA]
+        width, height = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+        aspect = width / height
+        keep = ((area >= np.pi * min_radius ** 2) & (area <= np.pi * max_radius ** 2)
+                & (aspect >= 0.7) & (aspect <= 1.3) & (area <= 0.9 * width * height))
+        if not keep.any():
+            return None
+        radius = np.sqrt(area[keep] / np.pi)
+        return np.column_stack([centroids[keep], radius]).astype(np.float32)[None]
+    
     def template_matching(self, image: np.ndarray, template: np.ndarray, 
                          threshold: float = 0.8) -> List[Tuple[int, int]]:
         """
@@ -155,12 +233,23 @@ class PatternRecognizer:
             threshold: Matching threshold (0-1)
             
         Returns:
-            List of (x, y) coordinates where template was found
+            List of (x, y) coordinates where template was found. Each match is
+            reported once, at its best-scoring position: scores around a true
+            match also exceed the threshold, so only local maxima within half
+            a template size are kept (equal-valued plateaus are all kept)
         """
         result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
-        locations = np.where(result >= threshold)
-        matches = list(zip(*locations[::-1]))
-        return matches
+        # Non-maximum suppression in C: a peak equals the max of its neighborhood
+        kh = max(1, template.shape[0] // 2)
+        kw = max(1, template.shape[1] // 2)
+        local_max = cv2.dilate(result, np.ones((kh, kw), np.uint8))
+        peaks = (result >= threshold) & (result == local_max)
+        # findNonZero scans in the same row-major order as np.nonzero, about
+        # twice as fast, and already yields (x, y) pairs
+        points = cv2.findNonZero(peaks.view(np.uint8))
+        if points is None:
+            return []
+        return list(map(tuple, points.reshape(-1, 2).tolist()))
     
     def get_image_info(self, image: np.ndarray) -> dict:
         """
@@ -195,13 +284,12 @@ class PatternRecognizer:
         Returns:
             Preprocessed binary image or None if processing fails
         """
-        # Load image
-        image = self.load_image(image_path)
-        if image is None:
+        # Load image (only the grayscale version is used)
+        gray = self.load_image(image_path, grayscale=True)
+        if gray is None:
             return None
         
         # Optimized pipeline using OpenCV directly
-        gray = self._to_gray(image)
         blurred = cv2.GaussianBlur(gray, (5, 5), 0)
         processed = cv2.adaptiveThreshold(
             blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
@@ -210,6 +298,57 @@ class PatternRecognizer:
         
         return processed
 
+    def analyze_exam_image(self, image_path: str, low_threshold: int = 50,
+                           high_threshold: int = 150, threshold_value: int = 127,
+                           min_radius: int = 10, max_radius: int = 100, dp: float = 1,
+                           min_dist: float = 20) -> Optional[dict]:
+        """
+        Run the basic analysis steps on an exam image in one pass.
+
+        Optimization: the image is loaded and converted to grayscale once, and
+        every step (edges, threshold, contours, circles, preprocessing) reuses
+        that same gray buffer instead of reloading/reconverting.
+
+        Args:
+            image_path: Path to the exam image
+            low_threshold: Lower Canny threshold
+            high_threshold: Upper Canny threshold
+            threshold_value: Binary threshold value (0-255)
+            min_radius: Minimum circle radius
+            max_radius: Maximum circle radius
+            dp: Inverse accumulator resolution for circle detection
+            min_dist: Minimum distance between detected circle centers
+
+        Returns:
+            Dictionary with keys image, gray, edges, binary, contours,
+            hierarchy, circles and preprocessed, or None if loading fails
+        """
+        image = self.load_image(image_path)
+        if image is None:
+            return None
+
+        gray = self._to_gray(image)
+        binary = self.apply_threshold(gray, threshold_value)
+        contours, hierarchy = self.find_contours(binary)
+
+        # Same pipeline as preprocess_exam_image, on the shared gray image
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        preprocessed = cv2.adaptiveThreshold(
+            blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY, 11, 2
+        )
+
+        return {
+            'image': image,
+            'gray': gray,
+            'edges': self.detect_edges(gray, low_threshold, high_threshold),
+            'binary': binary,
+            'contours': contours,
+            'hierarchy': hierarchy,
+            'circles': self.detect_circles(gray, min_radius, max_radius, dp, min_dist),
+            'preprocessed': preprocessed,
+        }
+
     # ------------------------------------------------------------------
     # Exam sheet template generation and alignment utilities
     # ------------------------------------------------------------------
@@ -246,153 +385,43 @@ class PatternRecognizer:
         Returns:
             A BGR (uint8) numpy image with the drawn template
         """
-        width, height = sheet_size
-        img = np.ones((height, width, 3), dtype=np.uint8) * 255
-
-        # Title
-        title_scale = 1.2
-        title_thickness = 2
-        title_font = cv2.FONT_HERSHEY_SIMPLEX
-        (t_w, t_h), _ = cv2.getTextSize(title, title_font, title_scale, title_thickness)
-        title_x = (width - t_w) // 2
-        title_y = margin + t_h
-        cv2.putText(img, title, (title_x, title_y), title_font, title_scale, (0, 0, 0), title_thickness, cv2.LINE_AA)
-
-        # Draw QR-style finder alignment markers (nested squares) in the four corners
-        def draw_finder(x, y, size):
-            # outer black
-            cv2.rectangle(img, (int(x), int(y)), (int(x + size), int(y + size)), (0, 0, 0), -1)
-            # inner white
-            inset1 = int(size * 0.18)
-            cv2.rectangle(img, (int(x + inset1), int(y + inset1)), (int(x + size - inset1), int(y + size - inset1)), (255, 255, 255), -1)
-            # center black
-            inset2 = int(size * 0.36)
-            cv2.rectangle(img, (int(x + inset2), int(y + inset2)), (int(x + size - inset2), int(y + size - inset2)), (0, 0, 0), -1)
-
-        sq = alignment_square_size
-        # place them at margins but ensure table area avoids them
-        draw_finder(margin, margin, sq)  # top-left
-        draw_finder(width - margin - sq, margin, sq)  # top-right
-        draw_finder(margin, height - margin - sq, sq)  # bottom-left
-        draw_finder(width - margin - sq, height - margin - sq, sq)  # bottom-right
-
-        # Student Name and Code cells (individual cells) under title
-        box_top = title_y + 15
-        box_height = 50
-        # Leave horizontal space for alignment markers by keeping inside margins + sq
-        content_left = margin + sq + 15
-        content_right = width - margin - sq - 15
-        # split into two cells: Name (70%) and Student Code (30%)
-        total_w = content_right - content_left
-        name_w = int(total_w * 0.7)
-        code_w = total_w - name_w - 8
-
-        name_left = content_left
-        name_right = name_left + name_w
-        code_left = name_right + 8
-        code_right = code_left + code_w
-
-        cv2.rectangle(img, (name_left, box_top), (name_right, box_top + box_height), (0, 0, 0), 2)
-        cv2.putText(img, "Name:", (name_left + 8, box_top + 28), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
-
-        cv2.rectangle(img, (code_left, box_top), (code_right, box_top + box_height), (0, 0, 0), 2)
-        cv2.putText(img, "Code:", (code_left + 8, box_top + 28), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
-
-        # Questions table: choices are rows, questions are columns
-        table_top = box_top + box_height + 20
-        # shrink table width and center it between content_left and content_right
-        content_w = content_right - content_left
-        table_w = int(content_w * 0.95)
-        table_left = content_left + (content_w - table_w) // 2
-        table_right = table_left + table_w
-        # reduce overall table height to keep sheet compact (smaller than before)
-        available_height = height - table_top - margin - sq - 20
-        table_height = int(available_height * 0.85)  # use 85% of available
-        table_bottom = table_top + table_height
-
-        # Compute cell sizes. Add one header row for question numbers
-        n_cols = max(1, num_questions)
-        n_choice_rows = max(1, choices_per_question)
-        header_h = max(18, int(table_height * 0.10))
-        remaining_h = table_height - header_h
-        # compact choice row height
-        choice_row_h = max(15, int(remaining_h / n_choice_rows))
-        # recompute table_bottom to fit header + choice rows
-        table_height = header_h + choice_row_h * n_choice_rows
-        table_bottom = table_top + table_height
-
-        # Reserve a small left column for choice labels
-        label_col_w = max(30, int(table_w * 0.08))
-        q_area_w = table_w - label_col_w
-        cell_w = q_area_w / n_cols
+        # The drawing code is shared with GeneradorPlantillas (same layout, English
+        # box labels). It is cached per parameter set; each call gets its own copy
+        return GeneradorPlantillas().generar_plantilla_hoja_examen(
+            title, num_questions, choices_per_question, sheet_size,
+            margin, alignment_square_size, qr_size,
+            etiqueta_nombre="Name:", etiqueta_codigo="Code:"
+        )
 
-        # Draw table: first draw header row with question numbers. We draw the label column first.
-        # Draw label column header (empty)
-        lbl_x1 = table_left
-        lbl_x2 = table_left + label_col_w
-        cv2.rectangle(img, (lbl_x1, table_top), (lbl_x2, table_top + header_h), (0, 0, 0), 1)
-
-        for col in range(n_cols):
-            col_x1 = int(table_left + label_col_w + col * cell_w)
-            col_x2 = int(table_left + label_col_w + (col + 1) * cell_w)
-            # header cell
-            header_y1 = table_top
-            header_y2 = table_top + header_h
-            cv2.rectangle(img, (col_x1, header_y1), (col_x2, header_y2), (0, 0, 0), 1)
-            qnum = col + 1
-            # center question number in header cell
-            (qw, qh), _ = cv2.getTextSize(str(qnum), cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
-            qx = col_x1 + (col_x2 - col_x1 - qw) // 2
-            qy = header_y1 + (header_h + qh) // 2
-            cv2.putText(img, str(qnum), (qx, qy), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
-
-            # draw choice rows
-            for row in range(n_choice_rows):
-                row_y1 = header_y2 + row * choice_row_h
-                row_y2 = header_y2 + (row + 1) * choice_row_h
-                cv2.rectangle(img, (col_x1, row_y1), (col_x2, row_y2), (0, 0, 0), 1)
-
-                # No circle: students can mark cells in different ways; leave cell empty
-                # Optionally draw a very light inner guide box (disabled by default)
-                # cx = int((col_x1 + col_x2) / 2)
-                # cy = int((row_y1 + row_y2) / 2)
-                # cv2.rectangle(img, (cx-8, cy-8), (cx+8, cy+8), (0,0,0), 1)
-
-        # Draw label column rows and labels
-        for row in range(n_choice_rows):
-            row_y1 = table_top + header_h + row * choice_row_h
-            row_y2 = table_top + header_h + (row + 1) * choice_row_h
-            cv2.rectangle(img, (lbl_x1, row_y1), (lbl_x2, row_y2), (0, 0, 0), 1)
-            label = chr(ord('A') + row) if row < 26 else str(row + 1)
-            cy = int((row_y1 + row_y2) / 2)
-            cv2.putText(img, label, (lbl_x1 + 8, cy + int(choice_row_h * 0.15)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
-
-        return img
-
-    def find_alignment_squares(self, image: np.ndarray, min_area: int = 2000) -> List[Tuple[int, int]]:
+    def find_alignment_squares(self, image: np.ndarray, min_area: int = 2000,
+                               min_area_floor: float = 800) -> List[Tuple[int, int]]:
         """
         Detect filled square alignment markers in an image.
 
         Args:
             image: Input image (BGR or grayscale)
             min_area: Minimum contour area to consider as an alignment square
+            min_area_floor: Absolute minimum contour area (lowered when the
+                markers are searched in a reduced copy, see _align_to_template)
 
         Returns:
             List of (x, y) centers for detected square markers. Returns an empty
             list if none are found.
         """
-        # Optimization: use helper method for grayscale conversion
-        gray = self._to_gray(image)
+        return self._find_alignment_squares_gray(self._to_gray(image), min_area, min_area_floor)
+
+    def _find_alignment_squares_gray(self, gray, min_area: float,
+                                     min_area_floor: float) -> List[Tuple[int, int]]:
+        """Marker search of find_alignment_squares on an already grayscale image."""
         _, thr = cv2.threshold(gray, 128, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
         # Use morphological closing to reduce small holes/blur effects
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
-        thr = cv2.morphologyEx(thr, cv2.MORPH_CLOSE, kernel)
+        thr = cv2.morphologyEx(thr, cv2.MORPH_CLOSE, _CLOSE_KERNEL)
         contours, _ = cv2.findContours(thr, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
         markers = []
         for cnt in contours:
             area = cv2.contourArea(cnt)
-            if area < max(800, min_area * 0.2):
+            if area < max(min_area_floor, min_area * 0.2):
                 continue
 
             # bounding rect and aspect ratio
@@ -428,26 +457,32 @@ class PatternRecognizer:
         ], dtype=np.float32)
 
     def _select_nearest_markers(self, candidates: List[Tuple[int, int]], expected: np.ndarray) -> Optional[np.ndarray]:
-        """Select the nearest candidate to each expected corner.
+        """Assign one distinct candidate to each expected corner.
+
+        The assignment minimizes the total squared distance over all four
+        corners, so a candidate that is nearest to two corners cannot be taken
+        by the wrong one (as a corner-by-corner greedy choice could).
 
         Returns an array of shape (4,2) with float32 coordinates or None if not enough candidates.
         """
         if len(candidates) < 4:
             return None
-        cand = [(float(x), float(y)) for x, y in candidates]
-        src_pts = []
-        # For each expected point, pick the nearest remaining candidate
-        for ex in expected:
-            dists = [((cx - ex[0])**2 + (cy - ex[1])**2, i) for i, (cx, cy) in enumerate(cand)]
-            if not dists:
-                return None
-            dists.sort()
-            best_idx = dists[0][1]
-            best = cand.pop(best_idx)
-            src_pts.append(best)
-        return np.array(src_pts, dtype=np.float32)
-
-    def align_exam_image(self, image: np.ndarray, template_size: Tuple[int, int] = (800, 1000), margin: int = 40, alignment_square_size: int = 40) -> Optional[np.ndarray]:
+        cand = np.asarray(candidates, dtype=np.float64)
+        # Squared distances, shape (4 expected, n candidates)
+        dists = ((cand[None, :, :] - np.asarray(expected, dtype=np.float64)[:, None, :]) ** 2).sum(axis=-1)
+        # An optimal assignment only ever uses one of the 4 nearest candidates of
+        # each corner (otherwise one of those is free and swapping to it is
+        # cheaper), so all 4**4 combinations of them are scored at once
+        nearest = np.argsort(dists, axis=1, kind='stable')[:, :4]
+        choices = nearest[np.arange(4), _CORNER_COMBINATIONS]
+        costs = dists[np.arange(4), choices].sum(axis=1)
+        # Discard combinations that use the same candidate for two corners
+        ordered = np.sort(choices, axis=1)
+        costs[(ordered[:, 1:] == ordered[:, :-1]).any(axis=1)] = np.inf
+        return cand[choices[np.argmin(costs)]].astype(np.float32)
+
+    def align_exam_image(self, image: np.ndarray, template_size: Tuple[int, int] = (800, 1000), margin: int = 40, alignment_square_size: int = 40,
+                         tolerance: float = 0.0) -> Optional[np.ndarray]:
         """
         Attempt to deskew/resize a scanned exam image using the four corner
         alignment squares. If four markers are found, a perspective transform
@@ -458,16 +493,55 @@ class PatternRecognizer:
             template_size: Desired output (width, height) in pixels
             margin: Margin used when template was generated
             alignment_square_size: Size of alignment squares used in template
+            tolerance: If the image already has the template size and every
+                marker is within this many pixels of its expected position, the
+                warp is skipped and a copy of the image is returned. With the
+                default 0 this only happens when the markers sit exactly where
+                they should (e.g. generated or already aligned sheets), where
+                the warp would be an identity
 
         Returns:
             Warped image aligned to the template coordinate system, or None if
             alignment failed (e.g., fewer than 4 markers detected)
         """
-        candidates = self.find_alignment_squares(image)
+        h_img, w_img = image.shape[:2]
+        return self._align_to_template(
+            image, (w_img, h_img), template_size, margin, alignment_square_size,
+            tolerance=tolerance
+        )
+
+    def _align_to_template(self, image, image_size: Tuple[int, int], template_size: Tuple[int, int],
+                           margin: int, alignment_square_size: int, marker_image=None,
+                           tolerance: float = 0.0):
+        """
+        Find the corner markers and warp the image to the template (see align_exam_image).
+        
+        The image size is passed explicitly because a cv2.UMat does not expose
+        its shape; the warped image has the same type as the input. Markers are
+        searched in marker_image when given (a grayscale version of image).
+        """
+        w_img, h_img = image_size
+        marker_gray = self._to_gray(image) if marker_image is None else marker_image
+        # Scans much larger than the template (which they are warped down to
+        # anyway) are searched in a grayscale copy reduced by an integer step,
+        # a fast block average with INTER_AREA. The copy stays at least twice
+        # the template size, below which small or edge-clipped markers lose
+        # their solidity. Area limits shrink by step^2 and the centers are
+        # mapped back to the full image
+        step = int(max(w_img, h_img) // (2 * max(template_size)))
+        if step > 1:
+            reduced = cv2.resize(marker_gray, None, fx=1.0 / step,
+                                 fy=1.0 / step, interpolation=cv2.INTER_AREA)
+            step_area = step * step
+            offset = (step - 1) / 2.0
+            candidates = [(cx * step + offset, cy * step + offset)
+                          for cx, cy in self._find_alignment_squares_gray(
+                              reduced, 2000 / step_area, 800 / step_area)]
+        else:
+            candidates = self._find_alignment_squares_gray(marker_gray, 2000, 800)
         if len(candidates) < 4:
             return None
 
-        h_img, w_img = image.shape[:2]
         # expected positions in the scanned image coordinate system
         expected_img = self._expected_marker_positions((w_img, h_img), margin, alignment_square_size)
         src = self._select_nearest_markers(candidates, expected_img)
@@ -477,6 +551,11 @@ class PatternRecognizer:
         # destination positions in the template coordinate system
         dst = self._expected_marker_positions(template_size, margin, alignment_square_size)
 
+        # Already aligned: skip the warp, the heaviest step of the pipeline
+        if (w_img, h_img) == tuple(template_size) and np.abs(src - dst).max() <= tolerance:
+            # (a UMat is downloaded into a new array by the caller anyway)
+            return image.copy() if isinstance(image, np.ndarray) else image
+
         M = cv2.getPerspectiveTransform(src, dst)
         w, h = template_size
         warped = cv2.warpPerspective(image, M, (w, h), flags=cv2.INTER_LINEAR)
@@ -496,15 +575,20 @@ class PatternRecognizer:
             Shadow-removed image (grayscale, 8-bit)
         """
         # Optimization: use helper method for conversion
-        gray = self._to_gray(image)
-        
+        return self._remove_shadows_gray(self._to_gray(image))
+
+    def _remove_shadows_gray(self, gray):
+        """Pipeline of remove_shadows on an already grayscale image (ndarray or UMat)."""
         # Optimized pipeline using OpenCV directly
         blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (20, 20))
-        background = cv2.morphologyEx(blurred, cv2.MORPH_DILATE, kernel, iterations=3)
-        shadow_removed = cv2.divide(blurred, background, scale=255)
+        # Three iterations of the 20x20 ellipse are kept on purpose: a single
+        # dilation with the equivalent 58x58 kernel gives the same result but
+        # is 2-3x slower, since non-rectangular kernels cost one pass per row
+        background = cv2.dilate(blurred, _SHADOW_KERNEL, iterations=3)
+        # The blurred image is not needed afterwards, so divide in place
+        cv2.divide(blurred, background, dst=blurred, scale=255)
         
-        return cv2.equalizeHist(shadow_removed)
+        return cv2.equalizeHist(blurred)
 
     def convert_to_black_and_white(self, image: np.ndarray, use_adaptive: bool = False, remove_shadows: bool = False) -> np.ndarray:
         """
@@ -517,7 +601,9 @@ class PatternRecognizer:
         
         Args:
             image: Input image (BGR or grayscale)
-            use_adaptive: If True, use adaptive threshold (better for variable lighting)
+            use_adaptive: If True, use adaptive threshold (better for variable lighting).
+                Combined with remove_shadows, a global Otsu threshold is used
+                instead, since the lighting is already flattened
             remove_shadows: If True, remove shadows first (useful if not done previously)
             
         Returns:
@@ -528,10 +614,16 @@ class PatternRecognizer:
         
         # Remove shadows only if explicitly requested
         if remove_shadows:
-            gray = self.remove_shadows(gray)
+            gray = self._remove_shadows_gray(gray)
         
         # Optimized thresholding pipeline with OpenCV
-        if use_adaptive:
+        if use_adaptive and remove_shadows:
+            # Lighting is already flattened, so a global Otsu threshold is enough.
+            # It is ~3x faster than the adaptive one and, unlike it, keeps the
+            # inside of filled marks black (adaptive only kept their edges)
+            _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+            return binary
+        elif use_adaptive:
             # Blur + adaptive threshold for variable lighting
             blurred = cv2.GaussianBlur(gray, (5, 5), 0)
             return cv2.adaptiveThreshold(
@@ -543,23 +635,21 @@ class PatternRecognizer:
             _, binary = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY)
             return binary
 
-    def extract_answer_cells(
-        self,
-        image: np.ndarray,
+    @staticmethod
+    def compute_layout(
         num_questions: int = 10,
         choices_per_question: int = 4,
         template_size: Tuple[int, int] = (800, 1000),
         margin: int = 40,
         alignment_square_size: int = 40,
-    ) -> List[List[Tuple[int, int, int, int]]]:
+    ) -> dict:
         """
-        Extract the coordinates of answer cells from an aligned exam sheet.
+        Compute the answer-table geometry shared by template and cell extraction.
         
-        Returns a list where each element represents a question, and contains
-        a list of (x, y, w, h) tuples for each choice cell.
+        Keeping this arithmetic in one place guarantees that debug tools and
+        extract_answer_cells always agree on where the table is.
         
         Args:
-            image: Aligned exam sheet image
             num_questions: Number of questions in the exam
             choices_per_question: Number of choices per question
             template_size: Template size (width, height)
@@ -567,17 +657,16 @@ class PatternRecognizer:
             alignment_square_size: Size of alignment squares
             
         Returns:
-            List of lists containing cell coordinates (x, y, width, height)
+            Dictionary with the intermediate layout values (title_y, box_top,
+            table_top, table_left, table_w, table_height, header_h,
+            choice_row_h, label_col_w, cell_w, ...)
         """
         width, height = template_size
         sq = alignment_square_size
         
         # Calculate table position (must match template generation)
         # Title and name box calculations
-        title_scale = 1.2
-        title_thickness = 2
-        title_font = cv2.FONT_HERSHEY_SIMPLEX
-        (t_w, t_h), _ = cv2.getTextSize("Exam", title_font, title_scale, title_thickness)
+        t_h = _TITLE_HEIGHT
         title_y = margin + t_h
         
         box_top = title_y + 15
@@ -604,29 +693,153 @@ class PatternRecognizer:
         q_area_w = table_w - label_col_w
         cell_w = q_area_w / n_cols
         
-        # Extract cell coordinates
-        cells = []
-        for col in range(n_cols):
-            question_cells = []
-            col_x1 = int(table_left + label_col_w + col * cell_w)
-            col_x2 = int(table_left + label_col_w + (col + 1) * cell_w)
+        return {
+            'width': width,
+            'height': height,
+            'title_y': title_y,
+            'title_height': t_h,
+            'box_top': box_top,
+            'box_height': box_height,
+            'table_top': table_top,
+            'content_left': content_left,
+            'content_right': content_right,
+            'content_w': content_w,
+            'table_left': table_left,
+            'table_w': table_w,
+            'available_height': available_height,
+            'table_height': table_height,
+            'n_cols': n_cols,
+            'n_choice_rows': n_choice_rows,
+            'header_h': header_h,
+            'remaining_h': remaining_h,
+            'choice_row_h': choice_row_h,
+            'label_col_w': label_col_w,
+            'q_area_w': q_area_w,
+            'cell_w': cell_w,
+        }
+
+    def extract_answer_cells(
+        self,
+        image: np.ndarray,
+        num_questions: int = 10,
+        choices_per_question: int = 4,
+        template_size: Tuple[int, int] = (800, 1000),
+        margin: int = 40,
+        alignment_square_size: int = 40,
+    ) -> List[List[Tuple[int, int, int, int]]]:
+        """
+        Extract the coordinates of answer cells from an aligned exam sheet.
+        
+        Returns a list where each element represents a question, and contains
+        a list of (x, y, w, h) tuples for each choice cell.
+        
+        Args:
+            image: Aligned exam sheet image
+            num_questions: Number of questions in the exam
+            choices_per_question: Number of choices per question
+            template_size: Template size (width, height)
+            margin: Template margin
+            alignment_square_size: Size of alignment squares
+            
+        Returns:
+            List of lists containing cell coordinates (x, y, width, height).
+            See extract_answer_cell_arrays for the same cells as NumPy arrays
+        """
+        xs, ys, ws, hs = self._cell_grid(
+            num_questions, choices_per_question,
+            tuple(template_size), margin, alignment_square_size
+        )
+        return [list(zip(*question)) for question in
+                zip(xs.tolist(), ys.tolist(), ws.tolist(), hs.tolist())]
+
+    def extract_answer_cell_arrays(
+        self,
+        image: np.ndarray,
+        num_questions: int = 10,
+        choices_per_question: int = 4,
+        template_size: Tuple[int, int] = (800, 1000),
+        margin: int = 40,
+        alignment_square_size: int = 40,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Extract the answer cells as coordinate arrays instead of tuples.
+        
+        Same cells as extract_answer_cells, laid out as four int32 arrays so
+        consumers can index and compute on all cells at once, e.g.
+        xs[np.arange(len(answers)), answers] gives the x of every chosen cell.
+        
+        Args:
+            image: Aligned exam sheet image
+            num_questions: Number of questions in the exam
+            choices_per_question: Number of choices per question
+            template_size: Template size (width, height)
+            margin: Template margin
+            alignment_square_size: Size of alignment squares
             
-            for row in range(n_choice_rows):
-                row_y1 = table_top + header_h + row * choice_row_h
-                row_y2 = table_top + header_h + (row + 1) * choice_row_h
-                
-                # Add small padding to avoid borders
-                padding = 3
-                x = col_x1 + padding
-                y = row_y1 + padding
-                w = (col_x2 - col_x1) - 2 * padding
-                h = (row_y2 - row_y1) - 2 * padding
-                
-                question_cells.append((x, y, w, h))
+        Returns:
+            Tuple (xs, ys, ws, hs) of read-only int32 arrays with shape
+            (num_questions, choices_per_question); cached and shared between calls
+        """
+        return self._cell_grid(
+            num_questions, choices_per_question,
+            tuple(template_size), margin, alignment_square_size
+        )
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _cell_grid(
+        num_questions: int,
+        choices_per_question: int,
+        template_size: Tuple[int, int],
+        margin: int,
+        alignment_square_size: int,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Compute the answer cells as separate coordinate arrays.
+        
+        Same cells as extract_answer_cells, but as four int32 arrays (x, y,
+        width, height) of shape (num_questions, choices_per_question), built by
+        broadcasting the column and row edges instead of a Python loop.
+        
+        The grid only depends on the arguments, so it is cached: a batch of
+        sheets with the same layout builds it once. The returned arrays are
+        read-only views shared between calls.
+        
+        Args:
+            num_questions: Number of questions in the exam
+            choices_per_question: Number of choices per question
+            template_size: Template size (width, height)
+            margin: Template margin
+            alignment_square_size: Size of alignment squares
             
-            cells.append(question_cells)
+        Returns:
+            Tuple (xs, ys, ws, hs) of int32 arrays
+        """
+        layout = PatternRecognizer.compute_layout(
+            num_questions, choices_per_question,
+            template_size, margin, alignment_square_size
+        )
+        table_left = layout['table_left']
+        table_top = layout['table_top']
+        n_cols = layout['n_cols']
+        n_choice_rows = layout['n_choice_rows']
+        header_h = layout['header_h']
+        choice_row_h = layout['choice_row_h']
+        label_col_w = layout['label_col_w']
+        cell_w = layout['cell_w']
         
-        return cells
+        # Column and row edges (astype truncates exactly like int())
+        col_edges = (table_left + label_col_w + np.arange(n_cols + 1) * cell_w).astype(np.int32)
+        row_edges = (table_top + header_h + np.arange(n_choice_rows + 1) * choice_row_h).astype(np.int32)
+        
+        # Add small padding to avoid borders
+        padding = 3
+        shape = (n_cols, n_choice_rows)
+        xs = np.broadcast_to((col_edges[:-1] + padding)[:, None], shape)
+        ys = np.broadcast_to((row_edges[:-1] + padding)[None, :], shape)
+        ws = np.broadcast_to((np.diff(col_edges) - 2 * padding)[:, None], shape)
+        hs = np.broadcast_to((np.diff(row_edges) - 2 * padding)[None, :], shape)
+        return xs, ys, ws, hs
 
     def is_cell_marked(
         self,
@@ -660,15 +873,59 @@ class PatternRecognizer:
         if cell.size == 0:
             return False
         
-        # Count black pixels (value 0 in binary image)
-        black_pixels = np.sum(cell == 0)
+        # Count black pixels (value 0 in binary image). countNonZero is a single
+        # SIMD pass over the slice, without a temporary boolean array
         total_pixels = cell.size
+        black_pixels = total_pixels - cv2.countNonZero(cell)
         
         # Calculate ratio
         black_ratio = black_pixels / total_pixels
         
         return black_ratio >= threshold
 
+    def cell_black_ratios(self, binary_image: np.ndarray, cells) -> np.ndarray:
+        """
+        Compute the black-pixel ratio of many cells at once.
+
+        Optimization: a single integral image of the black mask is built, so
+        each cell sum costs four table lookups instead of a slice + reduction.
+        Cells are clamped to the image exactly as in is_cell_marked.
+
+        Args:
+            binary_image: Binary (black and white) image
+            cells: Array-like of (x, y, width, height) with shape (..., 4),
+                e.g. the nested list returned by extract_answer_cells
+
+        Returns:
+            Float array of black ratios with the leading shape of cells
+        """
+        rects = np.asarray(cells, dtype=np.int64)
+        return self._black_ratios(
+            binary_image, rects[..., 0], rects[..., 1], rects[..., 2], rects[..., 3]
+        )
+
+    def _black_ratios(self, binary_image: np.ndarray, xs: np.ndarray, ys: np.ndarray,
+                      ws: np.ndarray, hs: np.ndarray) -> np.ndarray:
+        """Black-pixel ratios of cells given as coordinate arrays (see cell_black_ratios)."""
+        img_h, img_w = binary_image.shape[:2]
+        x = np.clip(xs, 0, img_w - 1)
+        y = np.clip(ys, 0, img_h - 1)
+        w = np.clip(ws, 1, img_w - x)
+        h = np.clip(hs, 1, img_h - y)
+
+        if x.size == 0:
+            return np.zeros(x.shape)
+
+        # Only the bounding box of the cells is integrated: the answer grid
+        # covers a fraction of the sheet, so this halves the memory traffic
+        x0, y0 = x.min(), y.min()
+        roi = binary_image[y0:(y + h).max(), x0:(x + w).max()]
+        x, y = x - x0, y - y0
+        integral = cv2.integral((roi == 0).view(np.uint8))
+        black_pixels = (integral[y + h, x + w] - integral[y, x + w]
+                        - integral[y + h, x] + integral[y, x])
+        return black_pixels / (w * h)
+
     def detect_marked_answers(
         self,
         image: np.ndarray,
@@ -677,7 +934,8 @@ class PatternRecognizer:
         template_size: Tuple[int, int] = (800, 1000),
         margin: int = 40,
         alignment_square_size: int = 40,
-        mark_threshold: float = 0.15
+        mark_threshold: float = 0.15,
+        use_otsu: bool = False
     ) -> List[Optional[int]]:
         """
         Detect marked answers from an exam sheet image.
@@ -696,48 +954,82 @@ class PatternRecognizer:
             margin: Template margin
             alignment_square_size: Alignment square size
             mark_threshold: Threshold for detecting marked cells
+            use_otsu: If True, binarize with an Otsu threshold computed over the
+                answer grid only, instead of the fixed gray level 200. This adapts
+                to sheets whose paper is darker than expected (uneven lighting)
             
         Returns:
             List of detected answers (0-indexed), None for invalid/unmarked questions
             Example: [0, 2, 1, None, 3, ...] means Q1=A, Q2=C, Q3=B, Q4=invalid, Q5=D
         """
+        # Cell coordinates as (num_questions, choices_per_question) arrays
+        xs, ys, ws, hs = self._cell_grid(
+            num_questions, choices_per_question,
+            tuple(template_size), margin, alignment_square_size
+        )
+        
         # Convert to black and white
-        binary = self.convert_to_black_and_white(image)
+        if use_otsu:
+            binary = self._otsu_binarize_cells(image, xs, ys, ws, hs)
+        else:
+            binary = self.convert_to_black_and_white(image)
         
-        # Extract cell coordinates
-        cells = self.extract_answer_cells(
-            image, num_questions, choices_per_question,
-            template_size, margin, alignment_square_size
-        )
+        # Optimization: black ratios of all cells from a single integral image
+        marked = self._black_ratios(binary, xs, ys, ws, hs) >= mark_threshold
         
-        # Detect marked answers
-        answers = []
-        for question_idx, question_cells in enumerate(cells):
-            marked_choices = []
-            
-            for choice_idx, cell_coords in enumerate(question_cells):
-                if self.is_cell_marked(binary, cell_coords, mark_threshold):
-                    marked_choices.append(choice_idx)
+        # Validate all questions at once: exactly one answer should be marked.
+        # Invalid questions (no answer or multiple answers) are -1 until the
+        # conversion to the returned list, where they become None.
+        answers = np.where(marked.sum(axis=1) == 1, marked.argmax(axis=1), -1)
+        return [a if a >= 0 else None for a in answers.tolist()]
+
+    def _otsu_binarize_cells(self, image: np.ndarray, xs: np.ndarray, ys: np.ndarray,
+                             ws: np.ndarray, hs: np.ndarray) -> np.ndarray:
+        """
+        Binarize the bounding box of the answer cells with a single Otsu threshold.
+        
+        The threshold is computed once over the answer grid, so the title, the
+        alignment markers and the margins do not bias it. Pixels outside the
+        grid are left white, since only the cells are read afterwards.
+        
+        Args:
+            image: Input image (BGR or grayscale)
+            xs, ys, ws, hs: Cell coordinate arrays as returned by _cell_grid
             
-            # Validate: exactly one answer should be marked
-            if len(marked_choices) == 1:
-                answers.append(marked_choices[0])
-            else:
-                # Invalid: either no answer or multiple answers marked
-                answers.append(None)
+        Returns:
+            Binary image where black=0, white=255
+        """
+        gray = self._to_gray(image)
+        binary = np.full_like(gray, 255)
         
-        return answers
-
+        if xs.size == 0:
+            return binary
+        img_h, img_w = gray.shape[:2]
+        x1 = max(int(xs.min()), 0)
+        y1 = max(int(ys.min()), 0)
+        x2 = min(int((xs + ws).max()), img_w)
+        y2 = min(int((ys + hs).max()), img_h)
+        if x2 <= x1 or y2 <= y1:
+            return binary
+        
+        _, binary[y1:y2, x1:x2] = cv2.threshold(
+            gray[y1:y2, x1:x2], 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU
+        )
+        return binary
+    
     def process_exam_sheet(
         self,
-        image_path: str,
+        image_path: Optional[str],
         num_questions: int = 10,
         choices_per_question: int = 4,
         template_size: Tuple[int, int] = (800, 1000),
         margin: int = 40,
         alignment_square_size: int = 40,
         mark_threshold: float = 0.15,
-        remove_shadows: bool = True
+        remove_shadows: bool = True,
+        image: Optional[np.ndarray] = None,
+        use_otsu: bool = False,
+        use_umat: bool = False
     ) -> dict:
         """
         Complete pipeline to process an exam sheet from image file.
@@ -750,7 +1042,7 @@ class PatternRecognizer:
         5. Detect marked answers
         
         Args:
-            image_path: Path to the exam sheet image
+            image_path: Path to the exam sheet image (may be None if image is given)
             num_questions: Number of questions
             choices_per_question: Number of choices per question
             template_size: Template size
@@ -758,6 +1050,15 @@ class PatternRecognizer:
             alignment_square_size: Alignment square size
             mark_threshold: Threshold for detecting marked cells
             remove_shadows: If True, removes shadows before processing (recommended)
+            image: Already decoded exam image; if given, image_path is not read,
+                avoiding a PNG encode/decode round-trip for in-memory images
+            use_otsu: If True, binarize the answer grid with an Otsu threshold
+                (see detect_marked_answers)
+            use_umat: If True, run shadow removal and alignment on a cv2.UMat so
+                OpenCV can dispatch them to an OpenCL device (GPU/iGPU). The image
+                is uploaded once and the aligned image is downloaded once before
+                mark detection; results are the same as the default path. Without
+                an OpenCL device OpenCV runs the same operations on the CPU
             
         Returns:
             Dictionary containing:
@@ -767,8 +1068,11 @@ class PatternRecognizer:
                 - 'aligned_image': Aligned image (if successful)
                 - 'shadow_removed_image': Shadow-removed image (if remove_shadows=True)
         """
-        # Load image
-        image = self.load_image(image_path)
+        # Load image (skipped when the caller already has it in memory).
+        # With shadow removal every later step works on the grayscale image,
+        # so it is decoded to a single channel directly
+        if image is None:
+            image = self.load_image(image_path, grayscale=remove_shadows)
         if image is None:
             return {
                 'success': False,
@@ -778,20 +1082,27 @@ class PatternRecognizer:
                 'shadow_removed_image': None
             }
         
-        # Remove shadows if requested (improves marker and mark detection)
-        processed_image = image
-        shadow_removed_image = None
-        if remove_shadows:
-            # Convert to grayscale and remove shadows
-            gray_no_shadows = self.remove_shadows(image)
-            # Convert back to BGR for alignment
-            shadow_removed_image = cv2.cvtColor(gray_no_shadows, cv2.COLOR_GRAY2BGR)
-            processed_image = shadow_removed_image
-        
-        # Align image
-        aligned = self.align_exam_image(
-            processed_image, template_size, margin, alignment_square_size
-        )
+        if use_umat:
+            aligned, shadow_removed_image = self._preprocess_umat(
+                image, template_size, margin, alignment_square_size, remove_shadows
+            )
+        else:
+            # Remove shadows if requested (improves marker and mark detection)
+            processed_image = image
+            shadow_removed_image = None
+            if remove_shadows:
+                # Convert to grayscale and remove shadows. Alignment and detection
+                # work on the grayscale result directly: expanding it to three
+                # identical channels first would not change any pixel, so only
+                # the returned images are converted to BGR
+                processed_image = self.remove_shadows(image)
+                shadow_removed_image = cv2.cvtColor(processed_image, cv2.COLOR_GRAY2BGR)
+            
+            # Align image
+            aligned = self.align_exam_image(
+                processed_image, template_size, margin, alignment_square_size
+            )
+        
         if aligned is None:
             return {
                 'success': False,
@@ -804,8 +1115,11 @@ class PatternRecognizer:
         # Detect answers (black and white conversion happens inside)
         answers = self.detect_marked_answers(
             aligned, num_questions, choices_per_question,
-            template_size, margin, alignment_square_size, mark_threshold
+            template_size, margin, alignment_square_size, mark_threshold,
+            use_otsu
         )
+        if remove_shadows and not use_umat:
+            aligned = cv2.cvtColor(aligned, cv2.COLOR_GRAY2BGR)
         
         return {
             'success': True,
@@ -814,3 +1128,61 @@ class PatternRecognizer:
             'aligned_image': aligned,
             'shadow_removed_image': shadow_removed_image
         }
+
+    def process_exam_sheets(self, image_paths: List[str], workers: Optional[int] = None, **kwargs) -> List[dict]:
+        """
+        Process many exam sheets concurrently with process_exam_sheet.
+        
+        The sheets are independent and nearly all of the per-sheet time is
+        spent inside OpenCV calls (decoding, shadow removal, warping), which
+        release the GIL, so a thread pool runs them in parallel without the
+        pickling cost of worker processes.
+        
+        Args:
+            image_paths: Paths of the exam sheet images
+            workers: Number of threads (default: os.cpu_count())
+            **kwargs: Extra arguments forwarded to process_exam_sheet
+            
+        Returns:
+            List of result dictionaries (see process_exam_sheet), in the same
+            order as image_paths
+        """
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            return list(executor.map(lambda path: self.process_exam_sheet(path, **kwargs), image_paths))
+
+    def _preprocess_umat(self, image: np.ndarray, template_size: Tuple[int, int], margin: int,
+                         alignment_square_size: int, remove_shadows: bool) -> Tuple:
+        """
+        Shadow removal and alignment on a cv2.UMat (T-API path of process_exam_sheet).
+        
+        The sheet is uploaded once. With shadow removal it stays in grayscale on
+        the device: the default path only expands the shadow-removed image back
+        to three identical channels for the alignment, so skipping that round
+        trip does not change any pixel. Without shadow removal the color image
+        is warped and the markers are searched in its grayscale version, as in
+        align_exam_image. Results are downloaded once for the returned images.
+        
+        Returns:
+            Tuple (aligned BGR image or None, shadow-removed BGR image or None)
+        """
+        h_img, w_img = image.shape[:2]
+        source = cv2.UMat(image)
+        is_color = len(image.shape) == 3
+        gray = cv2.cvtColor(source, cv2.COLOR_BGR2GRAY) if is_color else source
+        
+        shadow_removed_image = None
+        if remove_shadows:
+            source = gray = self._remove_shadows_gray(gray)
+            is_color = False
+            shadow_removed_image = cv2.cvtColor(gray.get(), cv2.COLOR_GRAY2BGR)
+        
+        aligned = self._align_to_template(
+            source, (w_img, h_img), template_size, margin, alignment_square_size,
+            marker_image=gray
+        )
+        if aligned is None:
+            return None, shadow_removed_image
+        aligned = aligned.get()
+        if not is_color:
+            aligned = cv2.cvtColor(aligned, cv2.COLOR_GRAY2BGR)
+        return aligned, shadow_removed_image
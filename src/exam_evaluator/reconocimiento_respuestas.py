@@ -5,22 +5,44 @@ Este modulo proporciona capacidades de reconocimiento de patrones usando OpenCV
 imagenes de examenes.
 """
 
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
+from functools import lru_cache
 from typing import Tuple, List, Optional
 
+# Todas las formas de elegir uno de sus 4 candidatos mas cercanos para cada una de
+# las 4 esquinas, forma (256, 4); se usa en _seleccionar_marcadores_mas_cercanos
+_COMBINACIONES_ESQUINAS = np.array(list(itertools.product(range(4), repeat=4)))
+
+# Elemento estructurante con el que quitar_sombras estima el fondo del papel
+# (se aplica con tres iteraciones de dilatacion)
+_KERNEL_SOMBRAS = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (20, 20))
+_ITERACIONES_SOMBRAS = 3
+
+# Elemento estructurante del cierre morfologico en encontrar_cuadrados_alineacion
+_KERNEL_CIERRE = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+
+# Pixeles alrededor de la cuadricula que quitar_sombras necesita para estimar el fondo de
+# las celdas igual que en la hoja completa (radio de las tres dilataciones + radio del desenfoque)
+_RELLENO_SOMBRAS = _ITERACIONES_SOMBRAS * (_KERNEL_SOMBRAS.shape[0] // 2) + 2
+
 # Clase para el reconocimiento de respuestas en examenes
 class ReconocedorRespuestas:
     
-    # Se inicializa el Reconocedor de respuestas, con open CV
-    def __init__(self):
-        self.opencv_version = cv2.__version__
+    # Versión de open CV en uso (atributo de clase, igual para todas las instancias)
+    opencv_version = cv2.__version__
     
     # Cargar una imagen desde la ruta especificada.
-    # La imagen se carga como un array numpy (forma en la que trabaja open CV), o None si falla la carga
-    def cargar_imagen(self, ruta_imagen: str) -> Optional[np.ndarray]:
+    # La imagen se carga como un array numpy (forma en la que trabaja open CV), o None si falla la carga.
+    # Con escala_grises=True se decodifica directo a un solo canal: se evita el buffer BGR y la
+    # conversion posterior (en JPEG el decodificador tambien omite los planos de color), por lo
+    # que es mas rapido cuando no se necesita el color
+    def cargar_imagen(self, ruta_imagen: str, escala_grises: bool = False) -> Optional[np.ndarray]:
 
-        imagen = cv2.imread(ruta_imagen)
+        imagen = cv2.imread(ruta_imagen, cv2.IMREAD_GRAYSCALE if escala_grises else cv2.IMREAD_COLOR)
 
         if imagen is None:
             print(f"Error: No se pudo cargar la imagen desde {ruta_imagen}")
@@ -37,8 +59,46 @@ class ReconocedorRespuestas:
         
         return cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY)
 
-    def encontrar_cuadrados_alineacion(self, imagen: np.ndarray, area_min: int = 2000) -> List[Tuple[int, int]]:
+    # Detectar circulos en una imagen en escala de grises con la transformada de Hough.
+    # El costo del acumulador crece con el rango de radios, conviene pasar el mas estrecho posible.
+    # Regresa un arreglo de circulos (x, y, radio) o None
+    def detectar_circulos(self, imagen: np.ndarray, radio_min: int = 10, radio_max: int = 100,
+                          dp: float = 1, distancia_min: float = 20) -> Optional[np.ndarray]:
+        
+        return cv2.HoughCircles(
+            imagen, cv2.HOUGH_GRADIENT, dp=dp, minDist=distancia_min,
+            param1=50, param2=30, minRadius=radio_min, maxRadius=radio_max
+        )
+
+    # Detectar circulos rellenos (burbujas de una hoja OMR) con componentes conexas.
+    # En una imagen binaria cada burbuja rellena es una sola mancha de tinta, asi que una
+    # pasada de etiquetado reemplaza al acumulador de Hough. Se conservan las manchas cuya
+    # area corresponde al rango de radios y cuyo rectangulo es casi cuadrado sin quedar lleno
+    # (un disco cubre cerca del 79% de su rectangulo, asi se descartan los marcadores cuadrados).
+    # La imagen binaria debe tener tinta negra (0) sobre fondo blanco.
+    # Regresa los circulos (x, y, radio) con la misma forma que detectar_circulos, con el
+    # radio calculado a partir del area, o None
+    def detectar_circulos_omr(self, imagen_binaria: np.ndarray, radio_min: int = 10, radio_max: int = 100) -> Optional[np.ndarray]:
+        
+        _, _, stats, centroides = cv2.connectedComponentsWithStats(
+            cv2.bitwise_not(imagen_binaria), connectivity=8, ltype=cv2.CV_32S
+        )
+        # La etiqueta 0 es el fondo
+        stats, centroides = stats[1:], centroides[1:]
+        area = stats[:, cv2.CC_STAT_AREA]
+        ancho, alto = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+        aspecto = ancho / alto
+        validos = ((area >= np.pi * radio_min ** 2) & (area <= np.pi * radio_max ** 2)
+                   & (aspecto >= 0.7) & (aspecto <= 1.3) & (area <= 0.9 * ancho * alto))
+        if not validos.any():
+            return None
+        radios = np.sqrt(area[validos] / np.pi)
+        return np.column_stack([centroides[validos], radios]).astype(np.float32)[None]
+
+    def encontrar_cuadrados_alineacion(self, imagen: np.ndarray, area_min: int = 2000, area_piso: float = 800) -> List[Tuple[int, int]]:
         # Encontrar los cuadrados de alineacion en las esquinas de la hoja de examen.
+        # area_piso es el area minima absoluta de un contorno (se reduce al buscar en
+        # una imagen reducida, ver alinear_imagen_examen).
         # Retorna una lista de tuplas (x, y) con las coordenadas centrales de los cuadrados encontrados.
 
         # Usar la conversion a escala de grises y umbralizacion para detectar contornos
@@ -46,15 +106,14 @@ class ReconocedorRespuestas:
         _, umbral = cv2.threshold(grises, 128, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
 
         # Usar cierre morfologico para reducir pequeños agujeros/efectos de desenfoque
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
-        umbral = cv2.morphologyEx(umbral, cv2.MORPH_CLOSE, kernel)
+        umbral = cv2.morphologyEx(umbral, cv2.MORPH_CLOSE, _KERNEL_CIERRE)
         contornos, _ = cv2.findContours(umbral, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
         # Filtrar contornos para encontrar cuadrados de alineacion
         marcadores = []
         for cnt in contornos:
             area = cv2.contourArea(cnt)
-            if area < max(800, area_min * 0.2):
+            if area < max(area_piso, area_min * 0.2):
                 continue
 
             # rectangulo delimitador y relación de aspecto
@@ -91,45 +150,62 @@ class ReconocedorRespuestas:
             [ancho - margen - cuadrado / 2.0, alto - margen - cuadrado / 2.0],
         ], dtype=np.float32)
 
-    # Seleccionar el candidato más cercano a cada esquina esperada.
+    # Asignar un candidato distinto a cada esquina esperada.
+    # La asignacion minimiza la suma de distancias al cuadrado de las cuatro esquinas,
+    # asi un candidato cercano a dos esquinas no puede quedar en la equivocada (como
+    # pasaba al elegir esquina por esquina el mas cercano restante).
     def _seleccionar_marcadores_mas_cercanos(self, candidatos: List[Tuple[int, int]], esperados: np.ndarray) -> Optional[np.ndarray]:
 
         # Si hay menos de 4 candidatos, no se puede alinear
         if len(candidatos) < 4:
             return None
         
-        # Convertir a lista de floats para mayor precision
-        cand = [(float(x), float(y)) for x, y in candidatos]
-        pts_origen = []
-
-        # Para cada punto esperado, elegir el candidato restante mas cercano
-        for ex in esperados:
-            # Calcular distancias al cuadrado
-            dists = [((cx - ex[0])**2 + (cy - ex[1])**2, i) for i, (cx, cy) in enumerate(cand)]
+        # Distancias al cuadrado, forma (4 esperados, n candidatos)
+        cand = np.asarray(candidatos, dtype=np.float64)
+        dists = ((cand[None, :, :] - np.asarray(esperados, dtype=np.float64)[:, None, :]) ** 2).sum(axis=-1)
 
-            # Si no hay distancias, no se puede alinear
-            if not dists:
-                return None
+        # Una asignacion optima solo usa alguno de los 4 candidatos mas cercanos de cada
+        # esquina (si no, uno de ellos queda libre y cambiarse a el cuesta menos), por
+        # eso se evaluan a la vez las 4**4 combinaciones
+        cercanos = np.argsort(dists, axis=1, kind='stable')[:, :4]
+        elecciones = cercanos[np.arange(4), _COMBINACIONES_ESQUINAS]
+        costos = dists[np.arange(4), elecciones].sum(axis=1)
 
-            # Ordenar distancias y seleccionar el mas cercano
-            dists.sort()
-            mejor_idx = dists[0][1]
-            mejor = cand.pop(mejor_idx)
-            pts_origen.append(mejor)
+        # Descartar combinaciones que usan el mismo candidato para dos esquinas
+        ordenadas = np.sort(elecciones, axis=1)
+        costos[(ordenadas[:, 1:] == ordenadas[:, :-1]).any(axis=1)] = np.inf
 
         # Convertir a array de floats, con los puntos de origen
-        return np.array(pts_origen, dtype=np.float32)
+        return cand[elecciones[np.argmin(costos)]].astype(np.float32)
 
     # Alinear una imagen de examen usando los marcadores encontrados.
     def alinear_imagen_examen(self, imagen: np.ndarray, tamano_plantilla: Tuple[int, int] = (800, 1000), margen: int = 40, tamano_cuadrado_alineacion: int = 40) -> Optional[np.ndarray]:
 
-        # Encontrar los cuadrados de alineación en la imagen
-        candidatos = self.encontrar_cuadrados_alineacion(imagen)
+        altura_img, ancho_img = imagen.shape[:2]
+
+        # Encontrar los cuadrados de alineación en la imagen.
+        # Optimizacion: en escaneos mucho mas grandes que la plantilla (la hoja se
+        # deforma a ese tamano de todas formas) los marcadores se buscan en una copia
+        # en grises reducida por un factor entero, que con INTER_AREA es un promedio
+        # de bloques rapido (un factor no entero es mucho mas lento). Se reduce solo
+        # hasta 2 veces la plantilla: en una copia mas chica los marcadores pequenos
+        # o cortados por el borde pierden solidez y se descartan. El umbral, el cierre
+        # y los contornos recorren paso^2 veces menos pixeles; los limites de area se
+        # reducen igual y los centros se llevan de vuelta a la imagen original
+        paso = int(max(altura_img, ancho_img) // (2 * max(tamano_plantilla)))
+        if paso > 1:
+            reducida = cv2.resize(self.convertir_a_escala_grises(imagen), None, fx=1.0 / paso,
+                                  fy=1.0 / paso, interpolation=cv2.INTER_AREA)
+            area_paso = paso * paso
+            desplazamiento = (paso - 1) / 2.0
+            candidatos = [(cx * paso + desplazamiento, cy * paso + desplazamiento)
+                          for cx, cy in self.encontrar_cuadrados_alineacion(
+                              reducida, area_min=2000 / area_paso, area_piso=800 / area_paso)]
+        else:
+            candidatos = self.encontrar_cuadrados_alineacion(imagen)
         if len(candidatos) < 4:
             return None
 
-
-        altura_img, ancho_img = imagen.shape[:2]
         # posiciones esperadas en el sistema de coordenadas de la imagen escaneada
         esperados_img = self._posiciones_marcadores_esperadas((ancho_img, altura_img), margen, tamano_cuadrado_alineacion)
         origen = self._seleccionar_marcadores_mas_cercanos(candidatos, esperados_img)
@@ -155,8 +231,7 @@ class ReconocedorRespuestas:
         # Pipeline optimizado con OpenCV para eliminar sombras
         # Desenfoque + dilatacion morfologica + division normalizada
         desenfocada = cv2.GaussianBlur(grises, (5, 5), 0)
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (20, 20))
-        fondo = cv2.morphologyEx(desenfocada, cv2.MORPH_DILATE, kernel, iterations=3)
+        fondo = cv2.morphologyEx(desenfocada, cv2.MORPH_DILATE, _KERNEL_SOMBRAS, iterations=_ITERACIONES_SOMBRAS)
         sin_sombras = cv2.divide(desenfocada, fondo, scale=255)
         
         # Se retorna equalizada la imagen
@@ -174,7 +249,14 @@ class ReconocedorRespuestas:
         
         # Pipeline de umbralizacion optimizado con OpenCV
         # Se utiliza un enfoque adaptativo (mejor para iluminacion variable) o simple (por defecto)
-        if usar_adaptativo:
+        if usar_adaptativo and quitar_sombras:
+            # La iluminacion ya esta aplanada, asi que un umbral global de Otsu basta: es
+            # unas 3 veces mas rapido que el adaptativo y, a diferencia de este, no deja
+            # en blanco el interior de las marcas rellenas (solo conservaba sus bordes)
+            _, binaria = cv2.threshold(grises, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+            return binaria
+
+        elif usar_adaptativo:
             # Blur + umbral adaptativo para iluminacion variable
             desenfocada = cv2.GaussianBlur(grises, (5, 5), 0)
             return cv2.adaptiveThreshold(
@@ -198,6 +280,49 @@ class ReconocedorRespuestas:
         tamano_cuadrado_alineacion: int = 40,
     ) -> List[List[Tuple[int, int, int, int]]]:
         
+        xs, ys, anchos, altos = self._cuadricula_celdas(
+            num_preguntas, opciones_por_pregunta,
+            tuple(tamano_plantilla), margen, tamano_cuadrado_alineacion
+        )
+        
+        # Extraer coordenadas de celda: una lista de (x, y, ancho, alto) por pregunta
+        return [list(map(tuple, pregunta)) for pregunta in np.stack((xs, ys, anchos, altos), axis=-1).tolist()]
+
+    # Extraer las mismas celdas que extraer_celdas_respuestas como cuatro arreglos de NumPy
+    # (xs, ys, anchos, altos) de forma (num_preguntas, opciones_por_pregunta), sin armar
+    # las tuplas: permite calcular sobre todas las celdas a la vez, por ejemplo
+    # xs[np.arange(len(respuestas)), respuestas] da la x de cada celda elegida.
+    # Los arreglos estan en cache, son de solo lectura y se comparten entre llamadas
+    def extraer_celdas_respuestas_arreglos(
+        self,
+        imagen: np.ndarray,
+        num_preguntas: int = 10,
+        opciones_por_pregunta: int = 4,
+        tamano_plantilla: Tuple[int, int] = (800, 1000),
+        margen: int = 40,
+        tamano_cuadrado_alineacion: int = 40,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        
+        return self._cuadricula_celdas(
+            num_preguntas, opciones_por_pregunta,
+            tuple(tamano_plantilla), margen, tamano_cuadrado_alineacion
+        )
+
+    # Calcular las celdas de respuesta como cuatro arreglos (x, y, ancho, alto) de forma
+    # (num_preguntas, opciones_por_pregunta).
+    # La cuadricula solo depende de los parametros, por eso se guarda en cache: un lote de
+    # hojas con la misma plantilla la calcula una sola vez. Los arreglos devueltos son de
+    # solo lectura y se comparten entre llamadas
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _cuadricula_celdas(
+        num_preguntas: int,
+        opciones_por_pregunta: int,
+        tamano_plantilla: Tuple[int, int],
+        margen: int,
+        tamano_cuadrado_alineacion: int,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        
         ancho, alto = tamano_plantilla
         cuadrado = tamano_cuadrado_alineacion
         
@@ -233,29 +358,19 @@ class ReconocedorRespuestas:
         ancho_area_respuesta = ancho_tabla - ancho_col_etiqueta
         ancho_celda = ancho_area_respuesta / n_cols
         
-        # Extraer coordenadas de celda
-        celdas = []
-        for col in range(n_cols):
-            celdas_pregunta = []
-            col_x1 = int(izquierda_tabla + ancho_col_etiqueta + col * ancho_celda)
-            col_x2 = int(izquierda_tabla + ancho_col_etiqueta + (col + 1) * ancho_celda)
-            
-            for fila in range(n_filas_opciones):
-                fila_y1 = parte_superior_tabla + altura_encabezado + fila * altura_fila_opcion
-                fila_y2 = parte_superior_tabla + altura_encabezado + (fila + 1) * altura_fila_opcion
-                
-                # Agregar pequeño relleno para evitar bordes
-                relleno = 3
-                x = col_x1 + relleno
-                y = fila_y1 + relleno
-                ancho = (col_x2 - col_x1) - 2 * relleno
-                alto = (fila_y2 - fila_y1) - 2 * relleno
-                
-                celdas_pregunta.append((x, y, ancho, alto))
-            
-            celdas.append(celdas_pregunta)
-        
-        return celdas
+        # Bordes de columnas y filas calculados de una vez con NumPy
+        # (astype(int) trunca igual que int())
+        bordes_x = (izquierda_tabla + ancho_col_etiqueta + np.arange(n_cols + 1) * ancho_celda).astype(int)
+        bordes_y = parte_superior_tabla + altura_encabezado + np.arange(n_filas_opciones + 1) * altura_fila_opcion
+        
+        # Agregar pequeño relleno para evitar bordes
+        relleno = 3
+        forma = (n_cols, n_filas_opciones)
+        xs = np.broadcast_to((bordes_x[:-1] + relleno)[:, None], forma)
+        ys = np.broadcast_to((bordes_y[:-1] + relleno)[None, :], forma)
+        anchos = np.broadcast_to((np.diff(bordes_x) - 2 * relleno)[:, None], forma)
+        altos = np.broadcast_to((np.diff(bordes_y) - 2 * relleno)[None, :], forma)
+        return xs, ys, anchos, altos
 
     # Determinar si una celda esta marcada analizando la proporción de pixeles negros
     def es_celda_marcada(
@@ -280,9 +395,10 @@ class ReconocedorRespuestas:
         if celda.size == 0:
             return False
         
-        # Contar pixeles negros (valor 0 en imagen binaria)
-        pixeles_negros = np.sum(celda == 0)
+        # Contar pixeles negros (valor 0 en imagen binaria). countNonZero recorre la
+        # celda en una sola pasada, sin crear un arreglo booleano temporal
         pixeles_totales = celda.size
+        pixeles_negros = pixeles_totales - cv2.countNonZero(celda)
         
         # Calcular proporcion
         proporcion_negra = pixeles_negros / pixeles_totales
@@ -291,6 +407,43 @@ class ReconocedorRespuestas:
         # Regresa False: si no esta marcada
         return proporcion_negra >= umbral
 
+    # Calcular la proporcion de pixeles negros de muchas celdas a la vez.
+    # Optimizacion: se construye una sola imagen integral de la mascara negra, asi
+    # la suma de cada celda cuesta cuatro consultas en lugar de recorrer sus pixeles.
+    # Las celdas se recortan a la imagen igual que en es_celda_marcada.
+    # Regresa un arreglo de proporciones con la forma de celdas sin el ultimo eje
+    # (por ejemplo (num_preguntas, opciones_por_pregunta))
+    def proporciones_negras_celdas(self, imagen_binaria: np.ndarray, celdas) -> np.ndarray:
+        
+        rects = np.asarray(celdas, dtype=np.int64)
+        return self._proporciones_negras(
+            imagen_binaria, rects[..., 0], rects[..., 1], rects[..., 2], rects[..., 3]
+        )
+
+    # Proporciones de pixeles negros de celdas dadas como arreglos de coordenadas
+    # (ver proporciones_negras_celdas)
+    def _proporciones_negras(self, imagen_binaria: np.ndarray, xs: np.ndarray, ys: np.ndarray,
+                             anchos: np.ndarray, altos: np.ndarray) -> np.ndarray:
+        
+        altura_img, ancho_img = imagen_binaria.shape[:2]
+        x = np.clip(xs, 0, ancho_img - 1)
+        y = np.clip(ys, 0, altura_img - 1)
+        ancho = np.clip(anchos, 1, ancho_img - x)
+        alto = np.clip(altos, 1, altura_img - y)
+
+        if x.size == 0:
+            return np.zeros(x.shape)
+
+        # Solo se integra el rectangulo que contiene las celdas: la cuadricula de
+        # respuestas ocupa una parte de la hoja y asi se lee la mitad de memoria
+        x0, y0 = x.min(), y.min()
+        region = imagen_binaria[y0:(y + alto).max(), x0:(x + ancho).max()]
+        x, y = x - x0, y - y0
+        integral = cv2.integral((region == 0).view(np.uint8))
+        pixeles_negros = (integral[y + alto, x + ancho] - integral[y, x + ancho]
+                          - integral[y + alto, x] + integral[y, x])
+        return pixeles_negros / (ancho * alto)
+
     # Detectar y validar las respuestas marcadas
     def detectar_respuestas_marcadas(
         self,
@@ -304,31 +457,37 @@ class ReconocedorRespuestas:
         preprocesar_sombras: bool = True
     ) -> List[Optional[int]]:
         
+        # Coordenadas de celdas como arreglos (en cache para la misma plantilla)
+        xs, ys, anchos, altos = self._cuadricula_celdas(
+            num_preguntas, opciones_por_pregunta,
+            tuple(tamano_plantilla), margen, tamano_cuadrado_alineacion
+        )
+        
+        # Recortar a la cuadricula (mas el relleno que usa la eliminacion de sombras) antes
+        # de preprocesar: solo importan los pixeles de las celdas y la tabla ocupa cerca de la
+        # mitad de la hoja, asi que desenfoque, dilatacion, division y ecualizacion tocan la
+        # mitad de memoria. La ecualizacion usa entonces el histograma de la tabla y no el de
+        # toda la hoja
+        x0, y0, x1, y1 = 0, 0, imagen.shape[1], imagen.shape[0]
+        if xs.size:
+            x0 = max(0, int(xs.min()) - _RELLENO_SOMBRAS)
+            y0 = max(0, int(ys.min()) - _RELLENO_SOMBRAS)
+            x1 = min(x1, int((xs + anchos).max()) + _RELLENO_SOMBRAS)
+            y1 = min(y1, int((ys + altos).max()) + _RELLENO_SOMBRAS)
+        if x0 >= x1 or y0 >= y1:
+            x0, y0, x1, y1 = 0, 0, imagen.shape[1], imagen.shape[0]
+        
         # Preprocesar: Convertir a blanco y negro con eliminacion de sombras
-        binaria = self.convertir_a_blanco_y_negro(imagen, quitar_sombras=preprocesar_sombras)
+        binaria = self.convertir_a_blanco_y_negro(imagen[y0:y1, x0:x1], quitar_sombras=preprocesar_sombras)
         
-        # Extraer coordenadas de celdas
-        celdas = self.extraer_celdas_respuestas(
-            imagen, num_preguntas, opciones_por_pregunta,
-            tamano_plantilla, margen, tamano_cuadrado_alineacion
-        )
+        # Detectar respuestas marcadas: todas las celdas desde una sola imagen integral
+        marcadas = self._proporciones_negras(binaria, xs - x0, ys - y0, anchos, altos) >= umbral_marca
         
-        # Detectar respuestas marcadas
-        respuestas = []
-        for idx_pregunta, celdas_pregunta in enumerate(celdas):
-            opciones_marcadas = []
-            
-            for idx_opcion, coordenadas_celda in enumerate(celdas_pregunta):
-                if self.es_celda_marcada(binaria, coordenadas_celda, umbral_marca):
-                    opciones_marcadas.append(idx_opcion)
-            
-            # Validar: exactamente una respuesta debe estar marcada
-            if len(opciones_marcadas) == 1:
-                respuestas.append(opciones_marcadas[0])
-            
-            else:
-                # Invalida: ya sea ninguna respuesta o multiples respuestas marcadas
-                respuestas.append(None)
+        # Validar: exactamente una respuesta debe estar marcada.
+        # Invalida (None): ya sea ninguna respuesta o multiples respuestas marcadas
+        validas = marcadas.sum(axis=1) == 1
+        elegidas = marcadas.argmax(axis=1)
+        respuestas = [int(e) if v else None for e, v in zip(elegidas, validas)]
         
         # Regresa una lista de respuestas detectadas
         # de forma tal [Pregunta1, Pregunta2, ..., PreguntaN]
@@ -336,6 +495,9 @@ class ReconocedorRespuestas:
         return respuestas
 
     # Pipeline completo para procesar una hoja de examen desde archivo de imagen.
+    # Con quitar_sombras=True (por defecto) la hoja se lee en grises, asi que
+    # imagen_alineada es BGR con tres canales iguales y no conserva los colores
+    # del escaneo; con quitar_sombras=False se alinea la imagen original a color
     def procesar_hoja_examen(
         self,
         ruta_imagen: str,
@@ -345,11 +507,13 @@ class ReconocedorRespuestas:
         margen: int = 40,
         tamano_cuadrado_alineacion: int = 40,
         umbral_marca: float = 0.15,
-        quitar_sombras: bool = True
+        quitar_sombras: bool = True,
+        devolver_sin_sombras: bool = True
     ) -> dict:
         
-        # Cargar imagen
-        imagen = self.cargar_imagen(ruta_imagen)
+        # Cargar imagen. Con eliminacion de sombras cada paso posterior trabaja en grises
+        # (los marcadores tambien se buscan en grises), asi que se decodifica directo a un canal
+        imagen = self.cargar_imagen(ruta_imagen, escala_grises=quitar_sombras)
         if imagen is None:
             return {
                 'exito': False,
@@ -360,13 +524,16 @@ class ReconocedorRespuestas:
             }
         
         # Quitar sombras si se solicita
-        # Guardamos imagen sin sombras para depuracion, pero la alineacion
-        # funciona mejor con la imagen original a color
+        # Guardamos imagen sin sombras para depuracion, pero la alineacion usa la
+        # hoja en grises sin quitarle las sombras. La deteccion de respuestas
+        # quita las sombras de la imagen alineada por su cuenta, asi que esta copia
+        # de toda la hoja solo se calcula si se va a devolver (devolver_sin_sombras)
         imagen_sin_sombras = None
-        if quitar_sombras:
+        if quitar_sombras and devolver_sin_sombras:
             imagen_sin_sombras = self.quitar_sombras(imagen)
         
-        # Alinear imagen (usar original a color para mejor detección de marcadores)
+        # Alinear imagen (la cargada, en grises o a color segun quitar_sombras,
+        # no la imagen sin sombras)
         alineada = self.alinear_imagen_examen(
             imagen, tamano_plantilla, margen, tamano_cuadrado_alineacion
         )
@@ -385,6 +552,10 @@ class ReconocedorRespuestas:
             tamano_plantilla, margen, tamano_cuadrado_alineacion, umbral_marca,
             preprocesar_sombras=quitar_sombras
         )
+        # La imagen alineada se sigue devolviendo en BGR (en la ruta en grises sus
+        # tres canales son iguales)
+        if alineada.ndim == 2:
+            alineada = cv2.cvtColor(alineada, cv2.COLOR_GRAY2BGR)
         
         # Regresar resultados como diccionario con toda la informacion
         return {
@@ -394,3 +565,13 @@ class ReconocedorRespuestas:
             'imagen_alineada': alineada,
             'imagen_sin_sombras': imagen_sin_sombras
         }
+
+    # Procesar muchas hojas de examen a la vez con procesar_hoja_examen.
+    # Las hojas son independientes y casi todo el tiempo de cada una se pasa dentro de
+    # OpenCV (decodificar, quitar sombras, alinear), que libera el GIL; por eso un pool
+    # de hilos las procesa en paralelo sin el costo de serializar imagenes entre procesos.
+    # Regresa la lista de diccionarios de resultados en el mismo orden que rutas
+    def procesar_lote(self, rutas: List[str], n_hilos: Optional[int] = None, **kwargs) -> List[dict]:
+        
+        with ThreadPoolExecutor(max_workers=n_hilos or os.cpu_count()) as ejecutor:
+            return list(ejecutor.map(lambda ruta: self.procesar_hoja_examen(ruta, **kwargs), rutas))
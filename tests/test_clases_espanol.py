@@ -2,26 +2,69 @@
 Tests para Módulos en Español (ReconocedorRespuestas y GeneradorPlantillas)
 """
 
-import sys
-import os
 import pytest
 import numpy as np
 import cv2
 
-# Agregar directorio src al path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from exam_evaluator import ReconocedorRespuestas, GeneradorPlantillas, PatternRecognizer
 
-from exam_evaluator import ReconocedorRespuestas, GeneradorPlantillas
+
+@pytest.fixture(scope="module")
+def generador():
+    """Crear una instancia de GeneradorPlantillas compartida por los tests del modulo."""
+    return GeneradorPlantillas()
+
+
+@pytest.fixture(scope="module")
+def reconocedor():
+    """Crear una instancia de ReconocedorRespuestas compartida por los tests del modulo."""
+    return ReconocedorRespuestas()
+
+
+@pytest.fixture(scope="module")
+def imagen_muestra():
+    """Crear una imagen de prueba simple."""
+    # Crear una imagen blanca con un rectángulo negro
+    imagen = np.full((100, 100, 3), 255, dtype=np.uint8)
+    imagen[25:76, 25:76] = 0
+    # Compartida por los tests del modulo: de solo lectura para que ningun test la altere
+    imagen.setflags(write=False)
+    return imagen
+
+
+@pytest.fixture(scope="module")
+def imagen_grises_muestra():
+    """Crear una imagen de prueba simple en escala de grises."""
+    imagen = np.full((100, 100), 255, dtype=np.uint8)
+    imagen[25:76, 25:76] = 0
+    # Compartida por los tests del modulo: de solo lectura para que ningun test la altere
+    imagen.setflags(write=False)
+    return imagen
+
+
+@pytest.fixture(scope="module")
+def plantilla_5_preguntas(generador):
+    """Plantilla de 5 preguntas compartida por los tests de integracion."""
+    plantilla = generador.generar_plantilla_hoja_examen(num_preguntas=5)
+    # Compartida por los tests del modulo: de solo lectura, cada test marca su copia
+    plantilla.setflags(write=False)
+    return plantilla
+
+
+def _hoja_rellena(reconocedor, plantilla, respuestas):
+    """Copia de la plantilla con una burbuja rellena por pregunta (None la deja en blanco)."""
+    hoja = plantilla.copy()
+    celdas = reconocedor.extraer_celdas_respuestas(hoja, num_preguntas=len(respuestas))
+    for pregunta, opcion in enumerate(respuestas):
+        if opcion is not None:
+            x, y, ancho, alto = celdas[pregunta][opcion]
+            cv2.circle(hoja, (x + ancho // 2, y + alto // 2), min(ancho, alto) // 2 - 2, (0, 0, 0), -1)
+    return hoja
 
 
 class TestGeneradorPlantillas:
     """Suite de tests para la clase GeneradorPlantillas."""
     
-    @pytest.fixture
-    def generador(self):
-        """Crear una instancia de GeneradorPlantillas para testing."""
-        return GeneradorPlantillas()
-    
     def test_inicializacion(self, generador):
         """Test que GeneradorPlantillas se inicialice correctamente."""
         assert generador is not None
@@ -52,30 +95,30 @@ class TestGeneradorPlantillas:
         assert plantilla is not None
         assert plantilla.shape == (1200, 1000, 3)
 
+    def test_plantilla_repetida_es_copia_independiente(self, generador):
+        """Test que las plantillas en caché sean iguales pero no compartidas."""
+        primera = generador.generar_plantilla_hoja_examen(titulo="Cache", num_preguntas=7)
+        segunda = generador.generar_plantilla_hoja_examen(titulo="Cache", num_preguntas=7)
+        assert np.array_equal(primera, segunda)
+        primera[:] = 0
+        tercera = generador.generar_plantilla_hoja_examen(titulo="Cache", num_preguntas=7)
+        assert np.array_equal(tercera, segunda)
+        assert segunda.flags.writeable
+
+    def test_plantilla_con_etiquetas_en_ingles(self, generador):
+        """Test que las etiquetas de los cuadros se puedan cambiar (como en PatternRecognizer)."""
+        ingles = generador.generar_plantilla_hoja_examen(
+            num_preguntas=5, etiqueta_nombre="Name:", etiqueta_codigo="Code:"
+        )
+        assert not np.array_equal(ingles, generador.generar_plantilla_hoja_examen(num_preguntas=5))
+        plantilla = PatternRecognizer().generate_exam_sheet_template(title="Examen", num_questions=5)
+        assert np.array_equal(plantilla, ingles)
+        assert plantilla.flags.writeable
+
 
 class TestReconocedorRespuestas:
     """Suite de tests para la clase ReconocedorRespuestas."""
     
-    @pytest.fixture
-    def reconocedor(self):
-        """Crear una instancia de ReconocedorRespuestas para testing."""
-        return ReconocedorRespuestas()
-    
-    @pytest.fixture
-    def imagen_muestra(self):
-        """Crear una imagen de prueba simple."""
-        # Crear una imagen blanca con un rectángulo negro
-        imagen = np.ones((100, 100, 3), dtype=np.uint8) * 255
-        cv2.rectangle(imagen, (25, 25), (75, 75), (0, 0, 0), -1)
-        return imagen
-    
-    @pytest.fixture
-    def imagen_grises_muestra(self):
-        """Crear una imagen de prueba simple en escala de grises."""
-        imagen = np.ones((100, 100), dtype=np.uint8) * 255
-        cv2.rectangle(imagen, (25, 25), (75, 75), 0, -1)
-        return imagen
-    
     def test_inicializacion(self, reconocedor):
         """Test que ReconocedorRespuestas se inicialice correctamente."""
         assert reconocedor is not None
@@ -95,8 +138,7 @@ class TestReconocedorRespuestas:
         assert binaria is not None
         assert len(binaria.shape) == 2
         # Imagen binaria debe tener solo valores 0 y 255
-        valores_unicos = np.unique(binaria)
-        assert all(v in [0, 255] for v in valores_unicos)
+        assert ((binaria == 0) | (binaria == 255)).all()
     
     def test_detectar_bordes(self, reconocedor, imagen_grises_muestra):
         """Test detección de bordes."""
@@ -130,13 +172,20 @@ class TestReconocedorRespuestas:
         assert binaria is not None
         assert len(binaria.shape) == 2
         # Debe ser binaria (solo 0 y 255)
-        valores_unicos = np.unique(binaria)
-        assert all(v in [0, 255] for v in valores_unicos)
-    
+        assert ((binaria == 0) | (binaria == 255)).all()
+
+    def test_convertir_a_blanco_y_negro_adaptativo_sin_sombras_rellena_marcas(self, reconocedor):
+        """Test que con sombras quitadas el modo adaptativo conserve marcas rellenas."""
+        imagen = np.full((300, 300, 3), 255, np.uint8)
+        imagen[120:151, 120:151] = 0
+        binaria = reconocedor.convertir_a_blanco_y_negro(imagen, usar_adaptativo=True, quitar_sombras=True)
+        assert np.all(binaria[125:146, 125:146] == 0)
+        assert np.all(binaria[:100] == 255)
+
     def test_extraer_celdas_respuestas(self, reconocedor):
         """Test extracción de coordenadas de celdas."""
         # Crear una imagen dummy
-        imagen = np.ones((1000, 800, 3), dtype=np.uint8) * 255
+        imagen = np.full((1000, 800, 3), 255, dtype=np.uint8)
         
         celdas = reconocedor.extraer_celdas_respuestas(
             imagen,
@@ -157,12 +206,23 @@ class TestReconocedorRespuestas:
                 assert x >= 0 and y >= 0
                 assert w > 0 and h > 0
     
+    def test_extraer_celdas_cuadricula_en_cache_solo_lectura(self, reconocedor):
+        """Test que extracciones repetidas compartan una cuadricula en cache de solo lectura."""
+        primera = reconocedor.extraer_celdas_respuestas(None, num_preguntas=6, tamano_plantilla=[800, 1000])
+        primera[0][0] = (0, 0, 0, 0)
+        segunda = reconocedor.extraer_celdas_respuestas(None, num_preguntas=6, tamano_plantilla=(800, 1000))
+        assert segunda[0][0] != (0, 0, 0, 0)
+        xs, ys, anchos, altos = reconocedor._cuadricula_celdas(6, 4, (800, 1000), 40, 40)
+        assert xs.shape == (6, 4)
+        assert not xs.flags.writeable
+        assert reconocedor._cuadricula_celdas(6, 4, (800, 1000), 40, 40)[0] is xs
+    
     def test_es_celda_marcada(self, reconocedor):
         """Test detección de celda marcada."""
         # Crear una imagen binaria con una región marcada
-        imagen_binaria = np.ones((100, 100), dtype=np.uint8) * 255
+        imagen_binaria = np.full((100, 100), 255, dtype=np.uint8)
         # Marcar un área (negro = 0)
-        cv2.rectangle(imagen_binaria, (10, 10), (40, 40), 0, -1)
+        imagen_binaria[10:41, 10:41] = 0
         
         # Test celda marcada
         celda_marcada = (10, 10, 30, 30)
@@ -172,6 +232,31 @@ class TestReconocedorRespuestas:
         celda_no_marcada = (60, 60, 30, 30)
         assert not reconocedor.es_celda_marcada(imagen_binaria, celda_no_marcada, umbral=0.15)
     
+    def test_proporciones_negras_celdas_coincide_con_es_celda_marcada(self, reconocedor):
+        """Test que las proporciones en lote coincidan con el cálculo por celda."""
+        imagen_binaria = np.full((100, 100), 255, dtype=np.uint8)
+        imagen_binaria[10:41, 10:41] = 0
+        celdas = [[(10, 10, 30, 30), (60, 60, 30, 30)], [(90, 90, 30, 30), (0, 0, 20, 20)]]
+        proporciones = reconocedor.proporciones_negras_celdas(imagen_binaria, celdas)
+        assert proporciones.shape == (2, 2)
+        assert proporciones[0, 0] == 1.0
+        assert proporciones[0, 1] == 0.0
+        for celdas_pregunta, proporciones_pregunta in zip(celdas, proporciones):
+            for celda, proporcion in zip(celdas_pregunta, proporciones_pregunta):
+                assert reconocedor.es_celda_marcada(imagen_binaria, celda, proporcion)
+                assert not reconocedor.es_celda_marcada(imagen_binaria, celda, proporcion + 1e-9)
+
+    def test_seleccionar_marcadores_asignacion_optima(self, reconocedor):
+        """Test que un candidato cercano a dos esquinas quede en la correcta."""
+        esperados = np.array([[0, 0], [10, 0], [0, 10], [10, 10]], dtype=np.float32)
+        # (4, 0) es el mas cercano a la esquina superior izquierda, pero la superior
+        # derecha no tiene otro candidato cercano
+        candidatos = [(4, 0), (-5, 0), (0, 10), (10, 10), (50, 50)]
+        seleccion = reconocedor._seleccionar_marcadores_mas_cercanos(candidatos, esperados)
+        assert seleccion.dtype == np.float32
+        assert seleccion.tolist() == [[-5, 0], [4, 0], [0, 10], [10, 10]]
+        assert reconocedor._seleccionar_marcadores_mas_cercanos(candidatos[:3], esperados) is None
+
     def test_detectar_circulos_retorna_formato_valido(self, reconocedor):
         """Test detección de círculos retorna formato correcto."""
         # Crear una imagen con un círculo
@@ -183,6 +268,26 @@ class TestReconocedorRespuestas:
         if circulos is not None:
             assert isinstance(circulos, np.ndarray)
     
+    def test_detectar_circulos_omr(self, reconocedor):
+        """Test detección de burbujas rellenas con componentes conexas."""
+        imagen = np.full((200, 300), 255, np.uint8)
+        cv2.circle(imagen, (60, 100), 20, (0,), -1)
+        cv2.circle(imagen, (140, 100), 20, (0,), -1)
+        imagen[80:121, 200:241] = 0
+        circulos = reconocedor.detectar_circulos_omr(imagen, radio_min=15, radio_max=25)
+        assert circulos.shape == (1, 2, 3)
+        assert np.allclose(circulos[0, :, :2], [[60, 100], [140, 100]])
+        assert reconocedor.detectar_circulos_omr(imagen, radio_min=30, radio_max=40) is None
+    
+    def test_extraer_celdas_respuestas_arreglos(self, reconocedor):
+        """Test que los arreglos de coordenadas tengan las mismas celdas que las tuplas."""
+        xs, ys, anchos, altos = reconocedor.extraer_celdas_respuestas_arreglos(
+            None, num_preguntas=7, opciones_por_pregunta=5
+        )
+        assert xs.shape == ys.shape == anchos.shape == altos.shape == (7, 5)
+        celdas = reconocedor.extraer_celdas_respuestas(None, num_preguntas=7, opciones_por_pregunta=5)
+        assert np.array_equal(np.stack([xs, ys, anchos, altos], axis=-1), np.asarray(celdas))
+    
     def test_cargar_imagen_archivo_inexistente(self, reconocedor):
         """Test que cargar imagen devuelve None para archivo inexistente."""
         imagen = reconocedor.cargar_imagen('/ruta/inexistente/imagen.jpg')
@@ -197,27 +302,112 @@ class TestReconocedorRespuestas:
 class TestIntegracionEspanol:
     """Tests de integración para verificar que ambas clases funcionen juntas."""
     
-    def test_flujo_completo_generacion_y_reconocimiento(self):
+    @pytest.mark.parametrize("num_preguntas, opciones_por_pregunta", [(5, 4), (2, 2), (10, 6), (20, 5)])
+    def test_flujo_completo_generacion_y_reconocimiento(self, generador, reconocedor, num_preguntas, opciones_por_pregunta):
         """Test flujo completo: generar plantilla y extraer celdas."""
-        generador = GeneradorPlantillas()
-        reconocedor = ReconocedorRespuestas()
-        
         # Generar plantilla
         plantilla = generador.generar_plantilla_hoja_examen(
             titulo="Test",
-            num_preguntas=5,
-            opciones_por_pregunta=4
+            num_preguntas=num_preguntas,
+            opciones_por_pregunta=opciones_por_pregunta
         )
         
         # Extraer celdas
         celdas = reconocedor.extraer_celdas_respuestas(
             plantilla,
-            num_preguntas=5,
-            opciones_por_pregunta=4
+            num_preguntas=num_preguntas,
+            opciones_por_pregunta=opciones_por_pregunta
         )
         
-        assert len(celdas) == 5
-        assert all(len(pregunta) == 4 for pregunta in celdas)
+        assert len(celdas) == num_preguntas
+        assert all(len(pregunta) == opciones_por_pregunta for pregunta in celdas)
+
+    def test_procesar_hoja_sin_devolver_imagen_sin_sombras(self, reconocedor, plantilla_5_preguntas, tmp_path):
+        """Test que omitir la imagen sin sombras no cambie las respuestas."""
+        plantilla = _hoja_rellena(reconocedor, plantilla_5_preguntas, [None, 2, None, None, None])
+        ruta = str(tmp_path / "hoja.png")
+        cv2.imwrite(ruta, plantilla)
+
+        completo = reconocedor.procesar_hoja_examen(ruta, num_preguntas=5)
+        rapido = reconocedor.procesar_hoja_examen(ruta, num_preguntas=5, devolver_sin_sombras=False)
+        assert completo['imagen_sin_sombras'] is not None
+        assert rapido['imagen_sin_sombras'] is None
+        assert rapido['respuestas'] == completo['respuestas']
+        assert rapido['respuestas'][1] == 2
+
+    def test_cargar_imagen_escala_grises(self, reconocedor, plantilla_5_preguntas, tmp_path):
+        """Test carga directa en grises contra la conversion de la imagen a color."""
+        ruta = str(tmp_path / "hoja.png")
+        cv2.imwrite(ruta, plantilla_5_preguntas)
+
+        color = reconocedor.cargar_imagen(ruta)
+        gris = reconocedor.cargar_imagen(ruta, escala_grises=True)
+        assert color.ndim == 3
+        assert gris.ndim == 2
+        assert np.array_equal(gris, reconocedor.convertir_a_escala_grises(color))
+
+        resultado = reconocedor.procesar_hoja_examen(ruta, num_preguntas=5)
+        assert resultado['imagen_alineada'].ndim == 3
+
+    def test_procesar_hoja_sombreada(self, reconocedor, plantilla_5_preguntas, tmp_path):
+        """Test eliminacion de sombras y deteccion en una hoja rotada con iluminacion desigual."""
+        plantilla = _hoja_rellena(reconocedor, plantilla_5_preguntas, [2, 0, 3, 1, 2])
+        altura, ancho_hoja = plantilla.shape[:2]
+        rotacion = cv2.getRotationMatrix2D((ancho_hoja / 2, altura / 2), 2, 0.97)
+        rotada = cv2.warpAffine(plantilla, rotacion, (ancho_hoja, altura), borderValue=(255, 255, 255))
+        # La iluminacion cae de izquierda a derecha
+        sombreada = (rotada * np.linspace(1.0, 0.8, ancho_hoja)[None, :, None]).astype(np.uint8)
+
+        # El fondo del papel son tres dilataciones con una elipse de 20x20
+        grises = cv2.cvtColor(sombreada, cv2.COLOR_BGR2GRAY)
+        desenfocada = cv2.GaussianBlur(grises, (5, 5), 0)
+        elipse = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (20, 20))
+        fondo = cv2.morphologyEx(desenfocada, cv2.MORPH_DILATE, elipse, iterations=3)
+        esperada = cv2.equalizeHist(cv2.divide(desenfocada, fondo, scale=255))
+        assert np.array_equal(reconocedor.quitar_sombras(sombreada), esperada)
+
+        ruta = str(tmp_path / "sombreada.png")
+        cv2.imwrite(ruta, sombreada)
+        resultado = reconocedor.procesar_hoja_examen(ruta, num_preguntas=5)
+        assert resultado['exito']
+        assert resultado['respuestas'] == [2, 0, 3, 1, 2]
+
+    def test_detectar_respuestas_ignora_fuera_de_tabla(self, reconocedor, plantilla_5_preguntas):
+        """Test que lo que hay fuera de la cuadricula no afecte la deteccion."""
+        plantilla = _hoja_rellena(reconocedor, plantilla_5_preguntas, [2, 0, 3, 1, 2])
+        esperadas = reconocedor.detectar_respuestas_marcadas(plantilla, num_preguntas=5)
+
+        # Titulo y cuadro de nombre tachados por completo
+        plantilla[:121] = 0
+        assert reconocedor.detectar_respuestas_marcadas(plantilla, num_preguntas=5) == esperadas
+        assert esperadas == [2, 0, 3, 1, 2]
+
+    def test_procesar_lote_conserva_orden(self, reconocedor, plantilla_5_preguntas, tmp_path):
+        """Test procesamiento en lote contra el pipeline de una sola hoja."""
+        rutas = []
+        for pregunta in range(3):
+            respuestas = [None] * 5
+            respuestas[pregunta] = 1
+            rutas.append(str(tmp_path / f"hoja_{pregunta}.png"))
+            cv2.imwrite(rutas[-1], _hoja_rellena(reconocedor, plantilla_5_preguntas, respuestas))
+        rutas.append(str(tmp_path / "inexistente.png"))
+        resultados = reconocedor.procesar_lote(rutas, n_hilos=2, num_preguntas=5)
+        assert [r['respuestas'] for r in resultados[:3]] == [
+            reconocedor.procesar_hoja_examen(ruta, num_preguntas=5)['respuestas'] for ruta in rutas[:3]
+        ]
+        assert resultados[0]['respuestas'] == [1, None, None, None, None]
+        assert not resultados[3]['exito']
+
+    def test_alinear_escaneo_grande_usa_copia_reducida(self, reconocedor, plantilla_5_preguntas):
+        """Test que un escaneo de alta resolucion se alinee igual que la hoja original."""
+        plantilla = _hoja_rellena(reconocedor, plantilla_5_preguntas, [0, 3, 1, 2, 0])
+        # 3200x4000: los marcadores se buscan en una copia reducida a la mitad
+        grande = cv2.resize(plantilla, None, fx=4, fy=4, interpolation=cv2.INTER_NEAREST)
+
+        alineada = reconocedor.alinear_imagen_examen(grande)
+        assert alineada.shape == plantilla.shape
+        assert np.abs(alineada.astype(int) - plantilla.astype(int)).mean() < 5
+        assert reconocedor.detectar_respuestas_marcadas(alineada, num_preguntas=5) == [0, 3, 1, 2, 0]
 
 
 def test_importacion_opencv():
@@ -2,41 +2,54 @@
 Tests for Pattern Recognition Module
 """
 
-import sys
-import os
 import pytest
 import numpy as np
 import cv2
 
-# Add src directory to path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
-
 from exam_evaluator import PatternRecognizer
 
 
+@pytest.fixture(scope="module")
+def recognizer():
+    """Create a PatternRecognizer instance shared by the module's tests."""
+    return PatternRecognizer()
+
+
+@pytest.fixture(scope="module")
+def sample_image():
+    """Create a simple test image."""
+    # Create a white image with a black rectangle
+    image = np.full((100, 100, 3), 255, dtype=np.uint8)
+    image[25:76, 25:76] = 0
+    # Shared by the module's tests: read-only so no test can alter it for the others
+    image.setflags(write=False)
+    return image
+
+
+@pytest.fixture(scope="module")
+def sample_gray_image():
+    """Create a simple grayscale test image."""
+    image = np.full((100, 100), 255, dtype=np.uint8)
+    image[25:76, 25:76] = 0
+    # Shared by the module's tests: read-only so no test can alter it for the others
+    image.setflags(write=False)
+    return image
+
+
+def _filled_sheet(recognizer, answers):
+    """Template with one filled bubble per question (answers[i] is the choice, None leaves it blank)."""
+    template = recognizer.generate_exam_sheet_template(num_questions=len(answers))
+    cells = recognizer.extract_answer_cells(template, num_questions=len(answers))
+    for question, choice in enumerate(answers):
+        if choice is not None:
+            x, y, w, h = cells[question][choice]
+            cv2.circle(template, (x + w // 2, y + h // 2), min(w, h) // 2 - 2, (0, 0, 0), -1)
+    return template
+
+
 class TestPatternRecognizer:
     """Test suite for PatternRecognizer class."""
     
-    @pytest.fixture
-    def recognizer(self):
-        """Create a PatternRecognizer instance for testing."""
-        return PatternRecognizer()
-    
-    @pytest.fixture
-    def sample_image(self):
-        """Create a simple test image."""
-        # Create a white image with a black rectangle
-        image = np.ones((100, 100, 3), dtype=np.uint8) * 255
-        cv2.rectangle(image, (25, 25), (75, 75), (0, 0, 0), -1)
-        return image
-    
-    @pytest.fixture
-    def sample_gray_image(self):
-        """Create a simple grayscale test image."""
-        image = np.ones((100, 100), dtype=np.uint8) * 255
-        cv2.rectangle(image, (25, 25), (75, 75), 0, -1)
-        return image
-    
     def test_initialization(self, recognizer):
         """Test that PatternRecognizer initializes correctly."""
         assert recognizer is not None
@@ -56,8 +69,7 @@ class TestPatternRecognizer:
         assert binary is not None
         assert len(binary.shape) == 2
         # Binary image should only have 0 and 255 values
-        unique_values = np.unique(binary)
-        assert all(v in [0, 255] for v in unique_values)
+        assert ((binary == 0) | (binary == 255)).all()
     
     def test_detect_edges(self, recognizer, sample_gray_image):
         """Test edge detection."""
@@ -96,6 +108,19 @@ class TestPatternRecognizer:
         if circles is not None:
             assert isinstance(circles, np.ndarray)
     
+    def test_detect_filled_circles(self, recognizer):
+        """Test connected-component bubble detection skips squares and lines."""
+        image = np.full((200, 300), 255, np.uint8)
+        cv2.circle(image, (60, 100), 20, 0, -1)
+        cv2.circle(image, (140, 100), 20, 0, -1)
+        image[80:121, 200:241] = 0
+        cv2.line(image, (0, 190), (299, 190), 0, 3)
+        circles = recognizer.detect_filled_circles(image, min_radius=15, max_radius=25)
+        assert circles.shape == (1, 2, 3)
+        assert np.allclose(circles[0, :, :2], [[60, 100], [140, 100]])
+        assert np.allclose(circles[0, :, 2], 20, atol=1)
+        assert recognizer.detect_filled_circles(image, min_radius=30, max_radius=40) is None
+    
     def test_template_matching(self, recognizer, sample_gray_image):
         """Test template matching."""
         # Use a small region as template
@@ -106,16 +131,206 @@ class TestPatternRecognizer:
         # Should find at least one match (the template location itself)
         assert len(matches) > 0
     
+    def test_template_matching_reports_each_match_once(self, recognizer):
+        """Test that neighboring above-threshold scores collapse to one match."""
+        image = np.full((120, 160), 255, dtype=np.uint8)
+        template = np.full((21, 21), 255, dtype=np.uint8)
+        cv2.circle(template, (10, 10), 6, 0, -1)
+        image[20:41, 30:51] = template
+        image[70:91, 110:131] = template
+        matches = recognizer.template_matching(image, template, threshold=0.5)
+        assert sorted(matches) == [(30, 20), (110, 70)]
+
+    def test_cell_black_ratios_matches_is_cell_marked(self, recognizer, sample_gray_image):
+        """Test batched black ratios against the per-cell computation."""
+        cells = [[(0, 0, 50, 50), (25, 25, 51, 51)], [(90, 90, 30, 30), (10, 60, 20, 20)]]
+        ratios = recognizer.cell_black_ratios(sample_gray_image, cells)
+        assert ratios.shape == (2, 2)
+        assert ratios[0, 1] == 1.0
+        for question_cells, question_ratios in zip(cells, ratios):
+            for cell, ratio in zip(question_cells, question_ratios):
+                assert recognizer.is_cell_marked(sample_gray_image, cell, ratio)
+                assert not recognizer.is_cell_marked(sample_gray_image, cell, ratio + 1e-9)
+
+    def test_compute_layout_matches_extracted_cells(self, recognizer):
+        """Test that the layout agrees with extract_answer_cells."""
+        layout = recognizer.compute_layout(num_questions=10, choices_per_question=4)
+        assert layout['n_cols'] == 10
+        assert layout['n_choice_rows'] == 4
+        cells = recognizer.extract_answer_cells(None, num_questions=10, choices_per_question=4)
+        x, y, w, h = cells[0][0]
+        assert x == int(layout['table_left'] + layout['label_col_w']) + 3
+        assert y == layout['table_top'] + layout['header_h'] + 3
+        assert h == layout['choice_row_h'] - 6
+
+    def test_extract_answer_cells_cached_grid_is_read_only(self, recognizer):
+        """Test that repeated extractions share a read-only cached grid."""
+        first = recognizer.extract_answer_cells(None, num_questions=6, template_size=[800, 1000])
+        first[0][0] = (0, 0, 0, 0)
+        second = recognizer.extract_answer_cells(None, num_questions=6, template_size=(800, 1000))
+        assert second[0][0] != (0, 0, 0, 0)
+        xs, ys, ws, hs = recognizer._cell_grid(6, 4, (800, 1000), 40, 40)
+        assert xs.shape == (6, 4)
+        assert not xs.flags.writeable
+        assert recognizer._cell_grid(6, 4, (800, 1000), 40, 40)[0] is xs
+
+    def test_extract_answer_cell_arrays_matches_cells(self, recognizer):
+        """Test that the coordinate arrays hold the same cells as the tuples."""
+        xs, ys, ws, hs = recognizer.extract_answer_cell_arrays(None, num_questions=7, choices_per_question=5)
+        assert xs.shape == ys.shape == ws.shape == hs.shape == (7, 5)
+        assert xs.dtype == np.int32
+        cells = recognizer.extract_answer_cells(None, num_questions=7, choices_per_question=5)
+        assert np.array_equal(np.stack([xs, ys, ws, hs], axis=-1), np.asarray(cells))
+
+    def test_align_exam_image_skips_warp_when_aligned(self, recognizer):
+        """Test that an already aligned sheet comes back unchanged as a copy."""
+        template = recognizer.generate_exam_sheet_template()
+        aligned = recognizer.align_exam_image(template)
+        assert aligned is not template
+        assert np.array_equal(aligned, template)
+        shifted = np.roll(template, 1, axis=1)
+        assert np.array_equal(recognizer.align_exam_image(shifted, tolerance=1.5), shifted)
+        assert not np.array_equal(recognizer.align_exam_image(shifted), shifted)
+
+    def test_align_exam_image_large_scan_uses_reduced_copy(self, recognizer):
+        """Test that a high-resolution scan aligns like the original sheet."""
+        template = _filled_sheet(recognizer, [0, 3, 1, 2, 0])
+        # 3200x4000: markers are searched in a copy reduced by half
+        large = cv2.resize(template, None, fx=4, fy=4, interpolation=cv2.INTER_NEAREST)
+        aligned = recognizer.align_exam_image(large)
+        assert aligned.shape == template.shape
+        assert np.abs(aligned.astype(int) - template.astype(int)).mean() < 5
+        assert recognizer.detect_marked_answers(aligned, num_questions=5) == [0, 3, 1, 2, 0]
+
+    def test_select_nearest_markers_optimal_assignment(self, recognizer):
+        """Test that a candidate close to two corners goes to the right one."""
+        expected = np.array([[0, 0], [10, 0], [0, 10], [10, 10]], dtype=np.float32)
+        # (4, 0) is nearest to top-left, but top-right has no other close candidate
+        candidates = [(4, 0), (-5, 0), (0, 10), (10, 10), (50, 50)]
+        selected = recognizer._select_nearest_markers(candidates, expected)
+        assert selected.dtype == np.float32
+        assert selected.tolist() == [[-5, 0], [4, 0], [0, 10], [10, 10]]
+        assert recognizer._select_nearest_markers(candidates[:3], expected) is None
+
     def test_load_image_nonexistent_file(self, recognizer):
         """Test loading a non-existent image."""
         result = recognizer.load_image("/nonexistent/path/image.jpg")
         assert result is None
     
+    def test_load_image_grayscale(self, recognizer, sample_image, tmp_path):
+        """Test loading an image directly as a single channel."""
+        image_path = str(tmp_path / "sample.png")
+        cv2.imwrite(image_path, sample_image)
+        gray = recognizer.load_image(image_path, grayscale=True)
+        assert gray.shape == (100, 100)
+        assert np.array_equal(gray, recognizer.convert_to_grayscale(recognizer.load_image(image_path)))
+
     def test_preprocess_exam_image_nonexistent_file(self, recognizer):
         """Test preprocessing a non-existent image."""
         result = recognizer.preprocess_exam_image("/nonexistent/path/image.jpg")
         assert result is None
 
+    def test_analyze_exam_image_matches_individual_steps(self, recognizer, sample_image, tmp_path):
+        """Test the one-pass analysis against the step-by-step methods."""
+        image_path = str(tmp_path / "sample.png")
+        cv2.imwrite(image_path, sample_image)
+        analysis = recognizer.analyze_exam_image(image_path)
+        assert analysis is not None
+        gray = recognizer.convert_to_grayscale(sample_image)
+        assert np.array_equal(analysis['gray'], gray)
+        assert np.array_equal(analysis['edges'], recognizer.detect_edges(gray))
+        assert np.array_equal(analysis['binary'], recognizer.apply_threshold(gray))
+        assert np.array_equal(analysis['preprocessed'], recognizer.preprocess_exam_image(image_path))
+        assert len(analysis['contours']) > 0
+
+    def test_process_exam_sheet_shaded_sheet(self, recognizer):
+        """Test shadow removal and grading on a rotated sheet with uneven lighting."""
+        template = _filled_sheet(recognizer, [2, 0, 3, 1, 2])
+        height, width = template.shape[:2]
+        rotation = cv2.getRotationMatrix2D((width / 2, height / 2), 2, 0.97)
+        rotated = cv2.warpAffine(template, rotation, (width, height), borderValue=(255, 255, 255))
+        # Lighting falls off from left to right
+        shaded = (rotated * np.linspace(1.0, 0.8, width)[None, :, None]).astype(np.uint8)
+
+        # The paper background is three dilations with a 20x20 ellipse
+        gray = cv2.cvtColor(shaded, cv2.COLOR_BGR2GRAY)
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        ellipse = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (20, 20))
+        background = cv2.morphologyEx(blurred, cv2.MORPH_DILATE, ellipse, iterations=3)
+        expected = cv2.equalizeHist(cv2.divide(blurred, background, scale=255))
+        assert np.array_equal(recognizer.remove_shadows(shaded), expected)
+
+        result = recognizer.process_exam_sheet(None, num_questions=5, image=shaded)
+        assert result['success']
+        assert result['answers'] == [2, 0, 3, 1, 2]
+
+    def test_process_exam_sheet_from_memory(self, recognizer):
+        """Test processing an in-memory image without a file path."""
+        template = _filled_sheet(recognizer, [None, 2, None, None, None])
+        result = recognizer.process_exam_sheet(None, num_questions=5, image=template)
+        assert result['success']
+        assert result['answers'] == [None, 2, None, None, None]
+
+    def test_detect_marked_answers_otsu_uneven_lighting(self, recognizer):
+        """Test that the Otsu grid threshold survives a darkened sheet."""
+        template = _filled_sheet(recognizer, [None, None, None, 1, None])
+        # Lighting falls off from left to right, paper ends up well below 200
+        gradient = np.linspace(1.0, 0.6, template.shape[1])[None, :, None]
+        darkened = (template * gradient).astype(np.uint8)
+        expected = [None, None, None, 1, None]
+        assert recognizer.detect_marked_answers(darkened, num_questions=5) != expected
+        assert recognizer.detect_marked_answers(darkened, num_questions=5, use_otsu=True) == expected
+        assert recognizer.detect_marked_answers(template, num_questions=5, use_otsu=True) == expected
+
+    def test_process_exam_sheet_umat_matches_default(self, recognizer):
+        """Test that the UMat path gives the same results as the default path."""
+        template = _filled_sheet(recognizer, [None, None, 3, None, None])
+        for remove_shadows in (True, False):
+            default = recognizer.process_exam_sheet(None, num_questions=5, image=template,
+                                                    remove_shadows=remove_shadows)
+            umat = recognizer.process_exam_sheet(None, num_questions=5, image=template,
+                                                 remove_shadows=remove_shadows, use_umat=True)
+            assert umat['answers'] == default['answers'] == [None, None, 3, None, None]
+            assert isinstance(umat['aligned_image'], np.ndarray)
+            assert np.array_equal(umat['aligned_image'], default['aligned_image'])
+
+    def test_color_umat_inputs(self, recognizer):
+        """Test that color and gray UMats are converted like the equivalent ndarrays."""
+        template = recognizer.generate_exam_sheet_template(num_questions=5)
+        umat = cv2.UMat(template)
+        gray = recognizer.convert_to_grayscale(umat).get()
+        assert gray.ndim == 2
+        assert np.array_equal(gray, recognizer.convert_to_grayscale(template))
+        assert np.array_equal(recognizer.remove_shadows(umat).get(),
+                              recognizer.remove_shadows(template))
+        binary = recognizer.convert_to_black_and_white(umat, remove_shadows=True).get()
+        assert binary.ndim == 2
+        assert np.array_equal(binary, recognizer.convert_to_black_and_white(template, remove_shadows=True))
+        gray_umat = cv2.UMat(gray)
+        assert recognizer.convert_to_grayscale(gray_umat) is gray_umat
+        assert np.array_equal(recognizer.remove_shadows(gray_umat).get(),
+                              recognizer.remove_shadows(template))
+
+    def test_process_exam_sheets_keeps_order(self, recognizer, tmp_path):
+        """Test batch processing against the single-sheet pipeline."""
+        paths = []
+        for question in range(3):
+            answers = [None] * 5
+            answers[question] = 1
+            paths.append(str(tmp_path / f"sheet_{question}.png"))
+            cv2.imwrite(paths[-1], _filled_sheet(recognizer, answers))
+        paths.append(str(tmp_path / "missing.png"))
+        results = recognizer.process_exam_sheets(paths, workers=2, num_questions=5)
+        assert [r['answers'] for r in results[:3]] == [
+            recognizer.process_exam_sheet(path, num_questions=5)['answers'] for path in paths[:3]
+        ]
+        assert results[0]['answers'] == [1, None, None, None, None]
+        assert not results[3]['success']
+
+    def test_analyze_exam_image_nonexistent_file(self, recognizer):
+        """Test analyzing a non-existent image."""
+        assert recognizer.analyze_exam_image("/nonexistent/path/image.jpg") is None
+
 
 def test_opencv_import():
     """Test that OpenCV is properly installed and can be imported."""